@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+'''
+Date: Sun Oct 18, 2026
+Purpose: This script provides an index from Scopus author ids to the EIDs of
+    their articles. It gives hash-based "shares any author" masks over an
+    author_ids list column, used to drop comparator articles written by CNH
+    authors, and answers co-authorship queries.
+'''
+
+import numpy as np, pandas as pd
+
+
+class AuthorIndex:
+    '''
+    Sorted (author_id, eid) pairs built from records with an author_ids list
+    column.
+    '''
+
+    def __init__(self, df=None, eid_col='eid', author_col='author_ids'):
+        self.eid_col, self.author_col = eid_col, author_col
+        self.authors = np.array([], dtype=object)
+        self.eids = np.array([], dtype=object)
+        self.unique_authors = np.array([], dtype=object)
+        if df is not None:
+            self.add(df)
+
+    def add(self, df):
+        '''
+        Add the authors of every record in df.
+        '''
+
+        pairs = df[[self.eid_col, self.author_col]].explode(self.author_col).dropna()
+        authors = np.concatenate([self.authors, pairs[self.author_col].astype(str).to_numpy(dtype=object)])
+        eids = np.concatenate([self.eids, pairs[self.eid_col].to_numpy(dtype=object)])
+        order = np.argsort(authors, kind='stable')
+        self.authors, self.eids = authors[order], eids[order]
+        self.unique_authors = pd.unique(self.authors)
+        return self
+
+    def __len__(self):
+        return len(self.unique_authors)
+
+    def __contains__(self, author_id):
+        i = np.searchsorted(self.authors, str(author_id))
+        return i < len(self.authors) and self.authors[i] == str(author_id)
+
+    def articles(self, author_id):
+        '''
+        EIDs of all indexed articles by author_id.
+        '''
+
+        lo = np.searchsorted(self.authors, str(author_id), side='left')
+        hi = np.searchsorted(self.authors, str(author_id), side='right')
+        return set(self.eids[lo:hi])
+
+    def overlaps(self, author_lists):
+        '''
+        Boolean mask, one value per list in author_lists, that is True where
+        any author in the list is in the index.
+        '''
+
+        s = pd.Series(list(author_lists), dtype=object).explode().dropna().astype(str)
+        hit = s.isin(self.unique_authors).groupby(level=0).any()
+        return hit.reindex(range(len(author_lists)), fill_value=False).to_numpy()
+
+    def coauthors(self, author_id):
+        '''
+        Authors who share at least one indexed article with author_id.
+        '''
+
+        mask = np.isin(self.eids, list(self.articles(author_id)))
+        return set(self.authors[mask]) - {str(author_id)}
+
+    def coauthored(self, a, b):
+        '''
+        Whether authors a and b share an indexed article.
+        '''
+
+        return bool(self.articles(a) & self.articles(b))
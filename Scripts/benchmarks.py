@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+'''
+Date: Sun Oct 18, 2026
+Purpose: Micro-benchmarks for the data collection pipeline. Each benchmark
+    checks that the current implementation gives the same output as the
+    original one kept below, and reports timings for both. bench_pull runs
+    the pull entry points against the mock Scopus server in mockserver.py and
+    reports records/sec, pages/sec, parse cost per entry and peak memory.
+Execution: python benchmarks.py (from the Scripts folder)
+'''
+
+import numpy as np, pandas as pd, contextlib, functions, io, os, tempfile, threading, time, tracemalloc
+from pandas.testing import assert_frame_equal
+from cache import ResponseCache
+from client import ScopusClient
+from functions import _parse_entries, clean_data, mappingdf, format_query, search, pull_manual, pull_comp, pull_cited
+from keys import KeyScheduler
+from mockserver import MockScopus, load_entries, load_records
+
+
+def _timeit(fn, *args, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return out, best
+
+def _report(name, old, new, n, unit):
+    print('{:<14} legacy {:8.1f} ms   current {:8.1f} ms   {:5.1f}x   ({} {})'.format(
+        name, old * 1000, new * 1000, old / new, n, unit))
+
+
+# =============================================================================
+# Legacy implementations
+# =============================================================================
+
+def _parse_article_legacy(entry):
+    '''
+    Parse Scopus output into pandas series (original per-entry parser)
+    '''
+
+    try:
+        scopus_id = entry['dc:identifier'][10:]
+    except:
+        scopus_id = None
+    try:
+        eid = entry['eid']
+    except:
+        eid = None
+    try:
+        title = entry['dc:title']
+    except:
+        title = None
+    try:
+        publicationname = entry['prism:publicationName']
+    except:
+        publicationname = None
+    try:
+        issn = entry['prism:issn']
+    except:
+        issn = None
+    try:
+        isbn = entry['prism:isbn']
+    except:
+        isbn = None
+    try:
+        eissn = entry['prism:eIssn']
+    except:
+        eissn = None
+    try:
+        volume = entry['prism:volume']
+    except:
+        volume = None
+    try:
+        issue = entry['prism:issueIdentifier']
+    except:
+        issue = None
+    try:
+        pagerange = entry['prism:pageRange']
+    except:
+        pagerange = None
+    try:
+        coverdate = entry['prism:coverDate']
+    except:
+        coverdate = None
+    try:
+        doi = entry['prism:doi']
+    except:
+        doi = None
+    try:
+        description = entry['dc:description']
+    except:
+        description = None
+    try:
+        citationcount = int(entry['citedby-count'])
+    except:
+        citationcount = None
+    try:
+        affiliation = entry['affiliation']
+    except:
+        affiliation = None
+    try:
+        aggregationtype = entry['prism:aggregationType']
+    except:
+        aggregationtype = None
+    try:
+        sub_dc = entry['subtypeDescription']
+    except:
+        sub_dc = None
+    try:
+        author_entry = entry['author']
+        author_id_list = [auth_entry['authid'] for auth_entry in author_entry]
+        author_name_list = [auth_entry['authname'] for auth_entry in author_entry]
+    except:
+        author_id_list = list()
+        author_name_list = list()
+    try:
+        auth_keywords = entry['authkeywords']
+    except:
+        auth_keywords = None
+    try:
+        fund_acr = entry['fund-acr']
+    except:
+        fund_acr = None
+    try:
+        fund_no = entry['fund-no']
+    except:
+        fund_no = None
+    try:
+        fund_sponsor = entry['fund-sponsor']
+    except:
+        fund_sponsor = None
+    try:
+        link_list = entry['link']
+        full_text_link = None
+        for link in link_list:
+            if link['@ref'] == 'full-text':
+                full_text_link = link['@href']
+    except:
+        full_text_link = None
+
+    return pd.Series({'scopus_id': scopus_id, 'eid': eid, 'title': title, 'publication_name':publicationname,\
+            'issn': issn, 'isbn': isbn, 'eissn': eissn, 'volume': volume, 'issue': issue, 'page_range': pagerange,\
+            'cover_date': coverdate, 'doi': doi, 'description': description,'citation_count': citationcount, \
+            'affiliation': affiliation, 'aggregation_type': aggregationtype, 'subtype_description': sub_dc, \
+            'author_name_list': author_name_list, 'author_ids': author_id_list, 'auth_keywords': auth_keywords, \
+            'fund_acr': fund_acr, 'fund_no': fund_no, 'fund_sponsor': fund_sponsor, 'full_text': full_text_link})
+
+
+quartile = dict(zip(mappingdf.Publication_Name, mappingdf.Quartile))
+fields = dict(zip(mappingdf.Publication_Name, mappingdf.Field))
+citescore = dict(zip(mappingdf.Publication_Name, mappingdf.CiteScore))
+
+def map_fields_legacy(df, cited=False, source_df=None):
+    '''
+    Original row-wise field mapping.
+    '''
+
+    if not cited:
+        df['Field'] = df['publication_name'].str.lower().map(fields)
+        df['Quartile'] = df['publication_name'].str.lower().map(quartile)
+        df['CiteScore'] = df['publication_name'].str.lower().map(citescore)
+    else:
+        eid_dict = dict(zip(source_df.eid, source_df.Field))
+        df['Source'] = df['EID'].map(eid_dict)
+        eid_dict = dict(zip(source_df.eid, source_df.Quartile))
+        df["SourceQuartile"] = df["EID"].map(eid_dict)
+        df['CrossIntra'] = df.apply(lambda row: 'Intra' if getattr(row, 'Source') == getattr(row, 'Field') else 'Cross', axis=1)
+        df['CiteType'] = df.apply(lambda row: getattr(row, 'CrossIntra') + ' ' + getattr(row, 'Source'), axis=1)
+    return df
+
+def clean_data_legacy(df, dataset, cited=False, source_df=None):
+    if not cited:
+        df = df.drop_duplicates('eid')
+    df = map_fields_legacy(df)
+    df = df[(df.aggregation_type.isin(['Journal', 'Trade Journal'])) & \
+                  (df.Field.isin(['NS', 'EC', 'Other', 'GI'])) & \
+                  (df.Quartile.isin(['Quartile 1', 'Quartile 2', 'Quartile 3', 'Quartile 4']))]
+    if cited:
+        df = map_fields_legacy(df, cited, source_df)
+    df['Dataset'] = dataset
+    return df
+
+
+# =============================================================================
+# Benchmarks
+# =============================================================================
+
+def bench_parse(entries, page=25):
+    '''
+    Parse entries page by page with the per-entry Series parser and with the
+    batch parser.
+    '''
+
+    pages = [entries[i:i + page] for i in range(0, len(entries), page)]
+    old, t_old = _timeit(lambda: [pd.DataFrame([_parse_article_legacy(e) for e in p]) for p in pages])
+    new, t_new = _timeit(lambda: [_parse_entries(p) for p in pages])
+    for a, b in zip(old, new):
+        assert_frame_equal(a, b)
+    _report('parse', t_old, t_new, len(entries), 'entries')
+
+def _uncategorize(df):
+    return df.astype({col: object for col in df.columns if isinstance(df[col].dtype, pd.CategoricalDtype)})
+
+def bench_clean(n=200000, n_sources=2000, seed=0):
+    '''
+    Clean a synthetic cited-by set of n rows citing n_sources articles with
+    the row-wise and vectorized field mapping.
+    '''
+
+    rng = np.random.default_rng(seed)
+    names = mappingdf.Publication_Name.str.title().to_numpy()
+    source = pd.DataFrame({'eid': ['2-s2.0-%d' % i for i in range(n_sources)],
+                           'publication_name': rng.choice(names, n_sources),
+                           'aggregation_type': 'Journal'})
+    source = clean_data_legacy(source, 'Interdisciplinary')
+    cited = pd.DataFrame({'EID': rng.choice(source.eid.to_numpy(), n),
+                          'publication_name': rng.choice(names, n),
+                          'aggregation_type': rng.choice(['Journal', 'Trade Journal', 'Book Series'], n)})
+    old, t_old = _timeit(lambda: clean_data_legacy(cited.copy(), 'Interdisciplinary', True, source), repeat=1)
+    new, t_new = _timeit(lambda: clean_data(cited.copy(), 'Interdisciplinary', True, source))
+    assert_frame_equal(old, _uncategorize(new).drop(columns=['JournalMatch', 'JournalScore']), check_dtype=False)
+    _report('clean cited', t_old, t_new, n, 'rows')
+
+
+def bench_records(n=100000):
+    '''
+    Read n records from csv and from Parquet, checking that author lists
+    come back the same from csv, from Parquet and after a Parquet -> csv
+    round trip.
+    '''
+
+    records = load_records()
+    records = pd.concat([records] * -(-n // len(records)), ignore_index=True).iloc[:n]
+    with tempfile.TemporaryDirectory() as tmp:
+        csv, parquet, csv_again = (os.path.join(tmp, f) for f in ['records.csv', 'records.parquet', 'again.csv'])
+        functions.write_records(records, csv)
+        old, t_old = _timeit(functions.read_records, csv, repeat=1)
+        functions.write_records(old, parquet)
+        new, t_new = _timeit(functions.read_records, parquet)
+        functions.write_records(new, csv_again)
+        chunk = next(functions.iter_records(parquet, chunksize=1000))
+        for df in [new, functions.read_records(csv_again), chunk]:
+            for col in functions.LIST_COLUMNS:
+                assert df[col].tolist() == old[col].iloc[:len(df)].tolist(), col
+    _report('read records', t_old, t_new, n, 'rows')
+
+
+# =============================================================================
+# Pull throughput against the mock Scopus server
+# =============================================================================
+
+def _pull_inputs(records, n):
+    '''
+    Inputs for each pull entry point from the first n records: manual
+    citations (every other one with a DOI), comparator queries and cited-by
+    sources.
+    '''
+
+    rows = records.iloc[:n].reset_index(drop=True)
+    citation = ('"' + rows['title'] + '," ' + rows['publication_name'] + ', v.' + rows['volume'].fillna('1') +
+                ', ' + rows['cover_date'].str[:4] + '.')
+    manual = pd.DataFrame({'unique_id': ['1234567_%d' % i for i in range(len(rows))], 'Citation': citation,
+                           'Title': rows['title'], 'Journal': rows['publication_name'],
+                           'DOI': rows['doi'].where(rows.index % 2 == 0).fillna('')})
+    queries = [format_query(row) for row in rows.itertuples()]
+    return manual, pd.DataFrame({'query': queries}), pd.DataFrame({'eid': rows['eid'], 'unique_id': manual['unique_id']})
+
+def _run_pull(fn, server, memory=False):
+    '''
+    Run fn in a fresh directory with an empty cache. Returns (records,
+    seconds, pages, parse seconds, entries parsed, peak bytes).
+    '''
+
+    functions.CACHE = ResponseCache(':memory:')
+    server.reset_stats()
+    parsed, lock = [0.0, 0], threading.Lock()
+    def timed_parse(entries):
+        start = time.perf_counter()
+        df = _parse_entries(entries)
+        with lock:
+            parsed[0] += time.perf_counter() - start
+            parsed[1] += len(entries)
+        return df
+    functions._parse_entries = timed_parse
+    cwd = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+            os.chdir(tmp)
+            if memory:
+                tracemalloc.start()
+            start = time.perf_counter()
+            n = len(fn(tmp))
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] if memory else None
+            tracemalloc.stop()
+    finally:
+        os.chdir(cwd)
+        functions._parse_entries = _parse_entries
+    return n, elapsed, server.stats['pages'], parsed[0], parsed[1], peak
+
+def bench_pull(n=200, latency=0.0, workers=8):
+    '''
+    Run search, pull_manual, pull_comp and pull_cited for n records against
+    the mock server (latency seconds per request).
+    '''
+
+    records = load_records()
+    manual, comp, cited = _pull_inputs(records, n)
+    saved = functions.CLIENT, functions.CACHE, functions._keys
+
+    def run_search(tmp):
+        pages = functions.CLIENT.map(lambda q: list(search(None, q)), comp['query'].unique())
+        return [df for p in pages for df, _ in p if type(df) != str]
+
+    def run_manual(tmp):
+        manual.to_csv(os.path.join(tmp, 'manual.csv'), index=False)
+        return pull_manual(os.path.join(tmp, 'manual.csv'), 'manual_out.csv')
+
+    entry_points = [('search', lambda tmp: pd.concat(run_search(tmp))), ('pull_manual', run_manual),
+                    ('pull_comp', lambda tmp: pull_comp(comp, 'comp_out.csv')),
+                    ('pull_cited', lambda tmp: pull_cited(cited, 'cited_out.csv'))]
+    with MockScopus(records, latency=latency) as server:
+        functions.CLIENT = ScopusClient(url=server.url, rate=1000, max_workers=workers)
+        functions._keys = KeyScheduler(['mock'], quota=10 ** 9)
+        server.quota = 10 ** 9
+        try:
+            for name, fn in entry_points:
+                n_rec, t, pages, t_parse, n_parsed, _ = _run_pull(fn, server)
+                peak = _run_pull(fn, server, memory=True)[-1]
+                print('{:<14} {:6d} records {:5d} pages {:7.2f} s {:8.0f} rec/s {:6.0f} pages/s '
+                      '{:6.1f} us/entry {:7.1f} MB peak'.format(name, n_rec, pages, t, n_rec / t, pages / t,
+                                                              1e6 * t_parse / max(n_parsed, 1), peak / 2 ** 20))
+        finally:
+            functions.CLIENT, functions.CACHE, functions._keys = saved
+
+
+if __name__ == '__main__':
+    entries = load_entries()
+    bench_parse(entries)
+    bench_clean()
+    bench_records()
+    bench_pull()
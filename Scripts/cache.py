@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+'''
+Date: Sun Oct 18, 2026
+Purpose: This script provides a persistent SQLite cache of raw Scopus Search
+    API pages, keyed by normalized query string and cursor. Reruns of
+    main.py are served from the cache instead of spending API quota. Entries
+    can expire after a TTL, the cache can be capped in size (least recently
+    used pages are evicted first), and offline mode serves only from cache.
+'''
+
+import re, sqlite3, threading, time
+
+
+def normalize_query(query):
+    '''
+    Normalize query for cache keys: lower case, collapse whitespace.
+    '''
+
+    return re.sub(r'\s+', ' ', query.strip().lower())
+
+
+class ResponseCache:
+    '''
+    SQLite store of raw JSON pages. ttl is in seconds and max_bytes caps the
+    total size of stored pages; None disables either limit.
+    '''
+
+    def __init__(self, path='scopus_cache.sqlite', ttl=None, max_bytes=None, offline=False):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS pages (
+                                 query TEXT, cursor TEXT, body TEXT, size INTEGER,
+                                 quota INTEGER, fetched REAL, accessed REAL,
+                                 PRIMARY KEY (query, cursor))''')
+        self.conn.commit()
+        row = self.conn.execute('SELECT quota FROM pages ORDER BY fetched DESC LIMIT 1').fetchone()
+        self.last_quota = row[0] if row else None
+
+    def get(self, query, cursor, max_age=None):
+        '''
+        Return cached page text, or None if missing, expired or older than
+        max_age seconds. Expired pages are still served in offline mode.
+        '''
+
+        key = (normalize_query(query), cursor)
+        with self.lock:
+            row = self.conn.execute('SELECT body, fetched FROM pages WHERE query = ? AND cursor = ?', key).fetchone()
+            if row is None:
+                return None
+            body, fetched = row
+            ttl = min(t for t in (self.ttl, max_age, float('inf')) if t is not None)
+            if time.time() - fetched > ttl and not self.offline:
+                return None
+            self.conn.execute('UPDATE pages SET accessed = ? WHERE query = ? AND cursor = ?', (time.time(),) + key)
+            self.conn.commit()
+        return body
+
+    def put(self, query, cursor, body, quota):
+        now = time.time()
+        with self.lock:
+            self.last_quota = quota
+            self.conn.execute('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)',
+                              (normalize_query(query), cursor, body, len(body), quota, now, now))
+            if self.max_bytes is not None:
+                self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        total = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM pages').fetchone()[0]
+        for query, cursor, size in self.conn.execute('SELECT query, cursor, size FROM pages ORDER BY accessed').fetchall():
+            if total <= self.max_bytes:
+                break
+            self.conn.execute('DELETE FROM pages WHERE query = ? AND cursor = ?', (query, cursor))
+            total -= size
+
+    def clear(self, expired_only=False):
+        '''
+        Delete all pages, or only those older than the TTL.
+        '''
+
+        with self.lock:
+            if expired_only and self.ttl is not None:
+                self.conn.execute('DELETE FROM pages WHERE fetched < ?', (time.time() - self.ttl,))
+            elif not expired_only:
+                self.conn.execute('DELETE FROM pages')
+            self.conn.commit()
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+'''
+Date: Sun Oct 18, 2026
+Purpose: This script provides a pooled, rate-limited client for the Scopus
+    Search API. Requests share one keep-alive session, are throttled by a
+    token bucket at the documented 9 calls/second, are retried with
+    exponential backoff on 429/5xx responses, and can be fanned out over a
+    bounded thread pool with a bounded number of searches in flight. Every
+    attempt, retry and rate limit wait is recorded in METRICS.
+'''
+
+import contextvars, queue, random, threading, time, requests
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from metrics import METRICS, query_type
+
+
+SCOPUS_URL = 'https://api.elsevier.com/content/search/scopus'
+RATE = 9 # API throttle rate = 9 calls/second
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    '''
+    Thread-safe token bucket. acquire() blocks until a token is available.
+    '''
+
+    def __init__(self, rate=RATE, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class ScopusClient:
+    '''
+    Keep-alive session with rate limiting, retry/backoff and a bounded thread
+    pool for running many searches concurrently.
+    '''
+
+    def __init__(self, url=SCOPUS_URL, rate=RATE, max_workers=8, retries=5,
+                 backoff=1.0, timeout=60):
+        self.url = url
+        self.bucket = TokenBucket(rate)
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _wait(self, attempt, r=None):
+        try:
+            return float(r.headers['Retry-After'])
+        except:
+            return self.backoff * 2 ** attempt + random.uniform(0, self.backoff)
+
+    def get(self, params):
+        '''
+        GET the search endpoint, retrying throttled and failed requests.
+        Every attempt is recorded with its own latency and status, apart
+        from the time spent waiting for the token bucket or backing off
+        before a retry, which are counted separately.
+        '''
+
+        qtype = query_type(params.get('query', ''))
+        for attempt in range(self.retries + 1):
+            start = time.perf_counter()
+            self.bucket.acquire()
+            METRICS.inc('scopus_throttle_wait_seconds_total', time.perf_counter() - start, query_type=qtype)
+            start = time.perf_counter()
+            try:
+                r = self.session.get(self.url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                self._record(qtype, attempt, time.perf_counter() - start, 'error')
+                if attempt == self.retries:
+                    raise
+                self._retry(qtype, 'error', self._wait(attempt))
+                continue
+            self._record(qtype, attempt, time.perf_counter() - start, r.status_code, r.headers.get('X-RateLimit-Remaining'))
+            if r.status_code not in RETRY_STATUS or attempt == self.retries:
+                return r
+            if r.headers.get('X-RateLimit-Remaining') == '0':
+                return r # weekly quota spent, retrying will not help
+            self._retry(qtype, r.status_code, self._wait(attempt, r))
+
+    def _record(self, qtype, attempt, elapsed, status, remaining=None):
+        METRICS.observe('scopus_request_seconds', elapsed, query_type=qtype)
+        METRICS.inc('scopus_responses_total', status=status)
+        if status not in (429, 'error'):
+            METRICS.inc('scopus_quota_used_total', query_type=qtype)
+        METRICS.event('request', query_type=qtype, status=status, attempt=attempt, seconds=elapsed, remaining=remaining)
+
+    def _retry(self, qtype, status, wait):
+        METRICS.inc('scopus_retries_total', query_type=qtype, status=status)
+        METRICS.inc('scopus_backoff_seconds_total', wait, query_type=qtype)
+        time.sleep(wait)
+
+    def map(self, fn, iterable, window=None):
+        '''
+        Apply fn to every item over the thread pool, yielding results in
+        input order. fn runs in a copy of the caller's context. At most
+        window items (by default twice max_workers) are submitted ahead of
+        the result being yielded, so results do not pile up in memory.
+        '''
+
+        context = contextvars.copy_context()
+        window = window or 2 * self.max_workers
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = deque()
+            try:
+                for item in iterable:
+                    futures.append(pool.submit(context.copy().run, fn, item))
+                    if len(futures) >= window:
+                        yield futures.popleft().result()
+                while futures:
+                    yield futures.popleft().result()
+            finally:
+                pool.shutdown(cancel_futures=True)
+
+    def stream(self, fn, iterable, window=None):
+        '''
+        Run the generator fn on every item over the thread pool, yielding
+        each item with an iterator over fn's results, in input order. The
+        results of the first item are yielded as they are produced; those
+        of later items (at most window, by default twice max_workers) are
+        held until it is their turn. Each iterator must be consumed before
+        the next item is taken.
+        '''
+
+        context = contextvars.copy_context()
+        window = window or 2 * self.max_workers
+
+        def run(item, results):
+            try:
+                for result in fn(item):
+                    results.put((True, result))
+                results.put((False, None))
+            except BaseException as e:
+                results.put((False, e))
+
+        def drain(results):
+            while True:
+                more, result = results.get()
+                if not more:
+                    if result is not None:
+                        raise result
+                    return
+                yield result
+
+        items, pending = iter(iterable), deque()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            def submit():
+                for item in islice(items, window - len(pending)):
+                    pending.append((item, queue.SimpleQueue()))
+                    pool.submit(context.copy().run, run, *pending[-1])
+
+            try:
+                submit()
+                while pending:
+                    item, results = pending.popleft()
+                    yield item, drain(results)
+                    submit()
+            finally:
+                pool.shutdown(cancel_futures=True)
@@ -9,225 +9,404 @@ Purpose: This script provides functions for parsing citations and querying
     quartile mappings.
 '''
 
-import pandas as pd, requests, re, string, unidecode
+import numpy as np, pandas as pd, ast, hashlib, json, os, re, string, threading, unidecode
 from datetime import datetime
-# from collections import Counter, defaultdict
-from pathlib import Path
+from cache import ResponseCache
+from client import ScopusClient
+from journal import ProgressJournal
+from keys import KeyScheduler
+from mapping import DATA, load_journals
+from metrics import METRICS, COUNT_BUCKETS, query_type
+from planner import QueryPlan
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from difflib import SequenceMatcher
+from itertools import islice
 
 
 # =============================================================================
-#  Read in an API key with 'COMPLETE' view authorization
+#  Read in API keys with 'COMPLETE' view authorization, one per line, on the
+#  first API call. Pulls spread their calls over all keys and pause when every
+#  key is exhausted.
 # =============================================================================
-with open('Scopus.txt') as f:
-    API_KEY = f.readline()
+_keys, _keys_lock = None, threading.Lock()
+
+def get_keys():
+    '''
+    KeyScheduler over the keys in Scopus.txt, read on first use.
+    '''
+
+    global _keys
+    with _keys_lock:
+        if _keys is None:
+            _keys = KeyScheduler.from_file('Scopus.txt')
+    return _keys
+
+# Shared keep-alive session, throttled to 9 calls/second
+CLIENT = ScopusClient()
+
+# On-disk cache of raw result pages, opened on the first API call. Set to e.g.
+# ResponseCache(ttl=7*24*3600, max_bytes=2**30) or ResponseCache(offline=True)
+# to expire pages, cap the cache size, or never call the API.
+CACHE, _cache_lock = None, threading.Lock()
+
+def get_cache():
+    '''
+    CACHE, opening scopus_cache.sqlite on first use if none was set.
+    '''
+
+    global CACHE
+    with _cache_lock:
+        if CACHE is None:
+            CACHE = ResponseCache()
+    return CACHE
 
 
 # =============================================================================
 # Generic functions for querying Scopus
 # =============================================================================
 
-def _parse_article(entry):
+def _full_text_link(link_list):
+    full_text_link = None
+    for link in link_list:
+        if link['@ref'] == 'full-text':
+            full_text_link = link['@href']
+    return full_text_link
+
+
+# Field spec for the page parser: (column, Scopus key, converter). Missing
+# keys and failed conversions give None.
+ARTICLE_FIELDS = [
+    ('scopus_id', 'dc:identifier', lambda v: v[10:]),
+    ('eid', 'eid', None),
+    ('title', 'dc:title', None),
+    ('publication_name', 'prism:publicationName', None),
+    ('issn', 'prism:issn', None),
+    ('isbn', 'prism:isbn', None),
+    ('eissn', 'prism:eIssn', None),
+    ('volume', 'prism:volume', None),
+    ('issue', 'prism:issueIdentifier', None),
+    ('page_range', 'prism:pageRange', None),
+    ('cover_date', 'prism:coverDate', None),
+    ('doi', 'prism:doi', None),
+    ('description', 'dc:description', None),
+    ('citation_count', 'citedby-count', int),
+    ('affiliation', 'affiliation', None),
+    ('aggregation_type', 'prism:aggregationType', None),
+    ('subtype_description', 'subtypeDescription', None),
+    ('author_name_list', None, None), # filled from 'author'
+    ('author_ids', None, None), # filled from 'author'
+    ('auth_keywords', 'authkeywords', None),
+    ('fund_acr', 'fund-acr', None),
+    ('fund_no', 'fund-no', None),
+    ('fund_sponsor', 'fund-sponsor', None),
+    ('full_text', 'link', _full_text_link),
+]
+
+
+def _parse_entries(entries):
     '''
-    Parse Scopus output into pandas dataframe
+    Parse a page of Scopus entries into a pandas dataframe, filling one column
+    at a time from ARTICLE_FIELDS.
     '''
 
-    try:
-        scopus_id = entry['dc:identifier'][10:]
-    except:
-        scopus_id = None
-    try:
-        eid = entry['eid']
-    except:
-        eid = None
-    try:
-        title = entry['dc:title']
-    except:
-        title = None
-    try:
-        publicationname = entry['prism:publicationName']
-    except:
-        publicationname = None
-    try:
-        issn = entry['prism:issn']
-    except:
-        issn = None
-    try:
-        isbn = entry['prism:isbn']
-    except:
-        isbn = None
-    try:
-        eissn = entry['prism:eIssn']
-    except:
-        eissn = None
-    try:
-        volume = entry['prism:volume']
-    except:
-        volume = None
-    try:
-        issue = entry['prism:issueIdentifier']
-    except:
-        issue = None
-    try:
-        pagerange = entry['prism:pageRange']
-    except:
-        pagerange = None
-    try:
-        coverdate = entry['prism:coverDate']
-    except:
-        coverdate = None
-    try:
-        doi = entry['prism:doi']
-    except:
-        doi = None
-    try:
-        description = entry['dc:description']
-    except:
-        description = None
-    try:
-        citationcount = int(entry['citedby-count'])
-    except:
-        citationcount = None
-    try:
-        affiliation = entry['affiliation']
-    except:
-        affiliation = None
-    try:
-        aggregationtype = entry['prism:aggregationType']
-    except:
-        aggregationtype = None
-    try:
-        sub_dc = entry['subtypeDescription']
-    except:
-        sub_dc = None
-    try:
-        author_entry = entry['author']
-        author_id_list = [auth_entry['authid'] for auth_entry in author_entry]
-        author_name_list = [auth_entry['authname'] for auth_entry in author_entry]
-    except:
-        author_id_list = list()
-        author_name_list = list()
-    try:
-        auth_keywords = entry['authkeywords']
-    except:
-        auth_keywords = None
-    try:
-        fund_acr = entry['fund-acr']
-    except:
-        fund_acr = None
-    try:
-        fund_no = entry['fund-no']
-    except:
-        fund_no = None
-    try:
-        fund_sponsor = entry['fund-sponsor']
-    except:
-        fund_sponsor = None
-    try:
-        link_list = entry['link']
-        full_text_link = None
-        for link in link_list:
-            if link['@ref'] == 'full-text':
-                full_text_link = link['@href']
-    except:
-        full_text_link = None
+    columns = {}
+    for col, key, convert in ARTICLE_FIELDS:
+        if key is None:
+            continue
+        values = [entry.get(key) for entry in entries]
+        if convert is not None:
+            for i, v in enumerate(values):
+                if v is not None:
+                    try:
+                        values[i] = convert(v)
+                    except:
+                        values[i] = None
+        columns[col] = values
+
+    names, ids = [], []
+    for entry in entries:
+        try:
+            author_entry = entry['author']
+            ids.append([auth_entry['authid'] for auth_entry in author_entry])
+            names.append([auth_entry['authname'] for auth_entry in author_entry])
+        except:
+            ids.append(list())
+            names.append(list())
+    columns['author_name_list'], columns['author_ids'] = names, ids
 
-    return pd.Series({'scopus_id': scopus_id, 'eid': eid, 'title': title, 'publication_name':publicationname,\
-            'issn': issn, 'isbn': isbn, 'eissn': eissn, 'volume': volume, 'issue': issue, 'page_range': pagerange,\
-            'cover_date': coverdate, 'doi': doi, 'description': description,'citation_count': citationcount, \
-            'affiliation': affiliation, 'aggregation_type': aggregationtype, 'subtype_description': sub_dc, \
-            'author_name_list': author_name_list, 'author_ids': author_id_list, 'auth_keywords': auth_keywords, \
-            'fund_acr': fund_acr, 'fund_no': fund_no, 'fund_sponsor': fund_sponsor, 'full_text': full_text_link})
+    return pd.DataFrame({col: columns[col] for col, _, _ in ARTICLE_FIELDS})
 
 
-def _search_scopus(key, query, cursor):
+def _fetch_page(key, query, cursor, max_age=None):
     '''
-    Search helper function
+    Return raw page text and remaining quota, from cache if possible (pages
+    up to max_age seconds old, if given). key is an API key or KeyScheduler;
+    None uses the keys in Scopus.txt.
     '''
 
-    url = 'https://api.elsevier.com/content/search/scopus'
+    cache = get_cache()
+    text = cache.get(query, cursor, max_age)
+    if text is not None:
+        METRICS.inc('scopus_cache_total', result='hit')
+        return text, cache.last_quota
+    if cache.offline:
+        METRICS.inc('scopus_cache_total', result='offline_miss')
+        return 'Offline: ' + query + ' not in cache', cache.last_quota
+    METRICS.inc('scopus_cache_total', result='miss')
+    if key is None:
+        key = get_keys()
     params = {'apikey': key, 'query': query, 'cursor': cursor,
            'httpAccept': 'application/json', 'view':'COMPLETE'}
-    r = requests.get(url, params=params)
-    remaining_quota = int(r.headers['X-RateLimit-Remaining'])
-    js = r.json()
+    if isinstance(key, KeyScheduler):
+        while True:
+            params['apikey'] = key.acquire()
+            r = CLIENT.get(params)
+            key.update(params['apikey'], r.headers)
+            if r.status_code != 429 or r.headers.get('X-RateLimit-Remaining') != '0':
+                break
+        remaining_quota = key.total_remaining()
+    else:
+        r = CLIENT.get(params)
+        remaining_quota = int(r.headers['X-RateLimit-Remaining'])
+    if r.status_code == 200:
+        cache.put(query, cursor, r.text, remaining_quota)
+    return r.text, remaining_quota
+
+
+def _search_scopus(key, query, cursor, max_age=None):
+    '''
+    Search helper function
+    '''
+
+    text, remaining_quota = _fetch_page(key, query, cursor, max_age)
     try:
+        js = json.loads(text)
         total_results = int(js['search-results']['opensearch:totalResults'])
         cursor = js['search-results']['cursor']['@next']
         entries = js['search-results']['entry']
         if len(entries[0]) == 2:
             return entries[0]['error'], remaining_quota
-        result_df = pd.DataFrame([_parse_article(entry) for entry in entries])
+        result_df = _parse_entries(entries)
         return result_df, total_results, cursor, remaining_quota
     except:
-        return r.text, remaining_quota
+        return text, remaining_quota
 
 
-def search(key, query):
+def _definitive(error):
     '''
-    Search Scopus with query string
+    Whether a search error is Scopus's answer to the query (an empty result
+    or an invalid query) rather than a transport or server failure, which
+    is worth retrying on the next run.
     '''
 
-    x = _search_scopus(key, query, '*')
-    if len(x) == 4:
-        result_df, total_results, cursor, remaining_quota = x
-        index = result_df.shape[0]
+    return error == 'Result set was empty' or 'INVALID_INPUT' in error
 
+def search(key, query, max_age=None):
+    '''
+    Search Scopus with query string. Yields one parsed page (up to 25
+    records) at a time with the remaining quota; an error is yielded as a
+    string and ends the search. With max_age, cached pages older than
+    max_age seconds are fetched again.
+    '''
+
+    cursor, index, total_results, pages = '*', 0, 1, 0
+    try:
         while index < total_results:
-            df, total_results, cursor, remaining_quota = _search_scopus(key, query, cursor)
-            result_df = result_df.append(df, ignore_index=True)
-            index = result_df.shape[0]
-        return result_df, remaining_quota
+            x = _search_scopus(key, query, cursor, max_age)
+            if len(x) != 4:
+                METRICS.inc('search_errors_total', query_type=query_type(query))
+                yield x[0], x[1]
+                return
+            result_df, total_results, cursor, remaining_quota = x
+            if result_df.shape[0] == 0:
+                return
+            index += result_df.shape[0]
+            pages += 1
+            yield result_df, remaining_quota
+    finally:
+        METRICS.observe('search_pages', pages, buckets=COUNT_BUCKETS, query_type=query_type(query))
+        METRICS.observe('search_records', index, buckets=COUNT_BUCKETS, query_type=query_type(query))
+        METRICS.event('search', query_type=query_type(query), pages=pages, records=index)
+
+
+ID_COLUMNS = ['scopus_id', 'eid', 'issn', 'isbn', 'eissn', 'volume', 'issue',
+              'unique_id', 'award_id', 'EID']
+LIST_COLUMNS = ['author_ids', 'author_name_list']
+CATEGORY_COLUMNS = ['Field', 'Quartile', 'Dataset', 'aggregation_type', 'subtype_description',
+                    'Source', 'SourceQuartile', 'CrossIntra', 'CiteType', 'JournalMatch']
+INT_COLUMNS = ['citation_count']
+
+def _is_parquet(file):
+    return str(file).endswith('.parquet')
+
+def read_records(file, columns=None, **kwargs):
+    '''
+    Read pulled records, keeping identifiers as strings and author lists as
+    lists. Parquet files (see write_records) are memory-mapped and only the
+    given columns are read.
+    '''
+
+    if _is_parquet(file):
+        return _with_lists(pd.read_parquet(file, columns=columns, memory_map=True, **kwargs))
+    kwargs.setdefault('dtype', {col: str for col in ID_COLUMNS})
+    return pd.read_csv(file, usecols=columns, converters={'author_ids': _literal_list,
+                                                          'author_name_list': _literal_list}, **kwargs)
+
+def iter_records(file, chunksize=100000, columns=None):
+    '''
+    Read records as read_records does, chunksize rows at a time.
+    '''
+
+    if _is_parquet(file):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(file, memory_map=True).iter_batches(batch_size=chunksize, columns=columns):
+            yield _with_lists(batch.to_pandas())
     else:
-        return x[0], x[1]
+        with read_records(file, columns=columns, chunksize=chunksize) as reader:
+            yield from reader
+
+_literal_lock = threading.Lock() # ast is not thread-safe in CPython 3.11, and stages read in parallel
+
+def _literal_list(s):
+    if not s.startswith('['):
+        return []
+    with _literal_lock:
+        return ast.literal_eval(s)
+
+def _as_list(v):
+    if isinstance(v, str):
+        return _literal_list(v)
+    return [] if np.isscalar(v) and pd.isna(v) or v is None else [str(x) for x in v]
+
+def _with_lists(df):
+    '''
+    df with its author list columns as lists of strings; Parquet gives
+    arrays, which to_csv would write without commas.
+    '''
+
+    return df.assign(**{col: df[col].map(_as_list) for col in LIST_COLUMNS if col in df.columns})
+
+def typed_records(df):
+    '''
+    Records with native column types: identifiers and text as strings,
+    author lists as lists, citation_count as a nullable integer, and
+    Field/Quartile/Dataset/aggregation_type and other low cardinality text
+    as categoricals.
+    '''
+
+    df = df.copy()
+    for col in df.columns:
+        if col in LIST_COLUMNS:
+            df[col] = df[col].map(_as_list)
+        elif col in INT_COLUMNS:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('Int64')
+        elif col in CATEGORY_COLUMNS:
+            df[col] = df[col].astype('category')
+        elif col in ID_COLUMNS or df[col].dtype == object or df[col].isna().all():
+            df[col] = df[col].astype('string')
+    return df
+
+def write_records(df, file, compression='zstd'):
+    '''
+    Write records to csv, or to compressed Parquet with typed columns
+    (typed_records) if file ends in '.parquet'. Parquet needs pyarrow.
+    '''
+
+    if _is_parquet(file):
+        typed_records(df).to_parquet(file, compression=compression, index=False)
+    else:
+        _with_lists(df).to_csv(file, index=False)
+
+def _staging(output_file):
+    '''
+    File a pull streams its rows to: output_file itself, or for Parquet
+    output a csv next to it that is converted when the pull finishes.
+    '''
+
+    return output_file[:-len('.parquet')] + '.stage.csv' if _is_parquet(output_file) else output_file
+
+def _error_file(output_file):
+    return 'Error_' + os.path.splitext(output_file)[0] + '.csv'
+
+def _open_output(output_file):
+    '''
+    Open the progress journal of output_file and its staging file for
+    appending, dropping any rows written after the last row recorded in the
+    journal. A staging file with rows but no journal was not written by a
+    journaled pull, and is left alone.
+    '''
+
+    stage, path = _staging(output_file), output_file + '.journal'
+    if not os.path.exists(path) and os.path.exists(stage) and os.path.getsize(stage):
+        raise ValueError('{} exists without a progress journal; move it aside or delete it to pull again'.format(stage))
+    journal = ProgressJournal(path)
+    if os.path.exists(stage):
+        os.truncate(stage, journal.offset)
+    return journal, open(stage, 'ab')
+
+def _finish_output(output_file, load):
+    '''
+    Convert the staging file of a Parquet output_file, and return the
+    records, or just output_file if load is False.
+    '''
+
+    if _is_parquet(output_file):
+        stage = _staging(output_file)
+        records = read_records(stage) if os.path.getsize(stage) else pd.DataFrame()
+        write_records(records, output_file)
+    return read_records(output_file) if load else output_file
+
+def _rewind(f, offset):
+    '''
+    Drop everything written to an open output file after offset.
+    '''
+
+    f.seek(offset)
+    f.truncate()
+
+def _write_chunk(f, df):
+    '''
+    Append df to an open output file, with header if the file is empty, and
+    return the new offset.
+    '''
+
+    f.write(df.to_csv(index=False, header=f.tell() == 0).encode('utf8'))
+    f.flush()
+    return f.tell()
 
 
 # =============================================================================
 # Quartile, Field, and CiteScore mapping
-# From Scopus source list (https://www.scopus.com/sources), we get the Scopus
-# within-field journal quartiles. We map the ASJC Code to EC, GI, NS, or
-# Other using a predetermined mapping. and choose field by heuristic described
-# in the paper. Some "Multidisciplinary" journals covering natural science
-# fields, such as "PLoS One", are also mapped to NS. Journals containing
-# interdisciplinary . Quartiles remain correct.
+# Built from the Scopus source list by mapping.py and loaded on first use from
+# its pickled artifact.
 # =============================================================================
 
-# d = pd.read_csv(str(Path('../Data/fieldmapping.csv')), index_col='ASJC_Code',
-#                 usecols=['ASJC_Code','Mapping']).to_dict()['Mapping']
-# scj = pd.read_csv(str(Path('../Data/CiteScore_Metrics_2011-2018_Download_Nov2019.csv')),
-#                   encoding='cp1252', dtype=str)
-# scj = scj.fillna('')
-# scj['Field'] = (scj['Scopus ASJC Code (Sub-subject Area)'].str[:2] + '**').map(d)
-# mask = (scj.Title.str.lower().isin(["anais da academia brasileira de ciencias", "archives des sciences", "asm science journal", "beijing daxue xuebao (ziran kexue ban)/acta scientiarum naturalium universitatis pekinensis", "brazilian archives of biology and technology", "bulletin de la societe royale des sciences de liege", "bulletin de la societe vaudoise des sciences naturelles", "bulletin of the georgian national academy of sciences", "chiang mai university journal of natural sciences", "ciencia and engenharia/ science and engineering journal", "comptes rendus de l'academie bulgare des sciences", "current science", "heliyon", "hunan daxue xuebao/journal of hunan university natural sciences", "interciencia", "jilin daxue xuebao (gongxueban)/journal of jilin university (engineering and technology edition)", "journal and proceedings - royal society of new south wales", "journal of advanced research", "journal of king saud university - science", "journal of sciences, islamic republic of iran", "journal of scientific and industrial research", "journal of shanghai jiaotong university (science)", "journal of the indian institute of science", "journal of the national science foundation of sri lanka", "journal of the royal society of new zealand", "journal of zhejiang university, science edition", "kexue tongbao, scientia", "kuwait journal of science", "liaoning gongcheng jishu daxue xuebao (ziran kexue ban)/journal of liaoning technical university (natural science edition)", "maejo international journal of science and technology", "malaysian journal of science", "national science review", "new scientist", "ohio journal of sciences", "pacific science", "papers and proceedings - royal society of tasmania", "philippine journal of science", "plos one", "proceedings of the latvian academy of sciences, section b: natural, exact, and applied sciences", "revista lasallista de investigacion", "royal society open science", "sadhana - academy proceedings in engineering sciences", "sains malaysiana", "science advances", "science bulletin", "science progress", "science, technology and society", "scienceasia", "scientific american", "scientific journal of king faisal university", "scientific reports", "shanghai jiaotong daxue xuebao/journal of shanghai jiaotong university", "shenyang jianzhu daxue xuebao (ziran kexue ban)/journal of shenyang jianzhu university (natural science)", "songklanakarin journal of science and technology", "tianjin daxue xuebao (ziran kexue yu gongcheng jishu ban)/journal of tianjin university science and technology", "tongji daxue xuebao/journal of tongji university", "transactions of tianjin university", "tsinghua science and technology", "universitas scientiarum", "walailak journal of science and technology", "world review of science, technology and sustainable development", "wuhan university journal of natural sciences", "xi'an shiyou daxue xuebao (ziran kexue ban)/journal of xi'an shiyou university, natural sciences edition", "xinan jiaotong daxue xuebao/journal of southwest jiaotong university", "zhongshan daxue xuebao/acta scientiarum natralium universitatis sunyatseni"]))
-# scj['Field'][mask] = 'NS'
-
-# rows = defaultdict(lambda:[])
-# for row in scj.itertuples():
-#     rows[getattr(row, 'Title').lower()].append((getattr(row, 'Quartile'), getattr(row, 'Field'), getattr(row, 'CiteScore')))
-
-# quartile, fields, citescore = {}, {}, {}
-# for key, val in rows.items():
-#     if len(set([pair[0] for pair in val])) == 1: # i.e. all same quartile
-#         f = [pair[1] for pair in val]
-#         if 'EC' in f:
-#             quartile[key], fields[key], citescore[key] = val[f.index('EC')]
-#         else:
-#             quartile[key], fields[key], citescore[key] = val[f.index(next(iter(Counter(f))))]
-#     else: # i.e. not all same quartile
-#         quartile[key], fields[key], citescore[key] = val[0]
-# fields['nature'] = 'GI'
-# fields['science'] = 'GI'
-# fields['proceedings of the national academy of sciences of the united states of america'] = 'GI'
-
-# mapping = {list(quartile)[i]:[quartile[list(quartile)[i]],
-#                               fields[list(quartile)[i]],
-#                               citescore[list(quartile)[i]]] for i in range(len(quartile))}
-# mappingdf = pd.DataFrame.from_dict(mapping, orient='index', columns=['Publication_Name', 'Quartile', 'Field', 'CiteScore'])
-# mappingdf.to_csv('journalmapping.csv')
-
-mappingdf = pd.read_csv(str(Path('../Data/journalmapping.csv')))
-quartile = dict(zip(mappingdf.Publication_Name, mappingdf.Quartile))
-fields = dict(zip(mappingdf.Publication_Name, mappingdf.Field))
-citescore = dict(zip(mappingdf.Publication_Name, mappingdf.CiteScore))
+_journals = None
+
+def get_journals():
+    '''
+    Journal mapping table and its resolution index, loaded on first use.
+    '''
+
+    global _journals
+    if _journals is None:
+        _journals = load_journals()
+    return _journals
+
+def __getattr__(name):
+    # Lazy module attributes kept for scripts that use the old globals
+    if name == 'KEYS':
+        return get_keys()
+    if name == 'API_KEY':
+        return get_keys().keys[0]
+    if name == 'JOURNALS':
+        return get_journals()[0]
+    if name == 'JOURNAL_INDEX':
+        return get_journals()[1]
+    if name == 'mappingdf':
+        return get_journals()[0].reset_index()
+    raise AttributeError(name)
 
 
 # =============================================================================
@@ -242,78 +421,238 @@ def simple_string(s):
 
     return unidecode.unidecode(s.lower().translate(str.maketrans('', '', string.punctuation.replace('-', ''))))
 
-def citation_split(file):
+# Citations with and without volume ('v.'), title in double quotes or, in
+# older exports, single quotes. Double quotes are tried first, since a single
+# quote also occurs in author names (O'Meara)
+CITATION = r'"(?P<Title>.+?),".*?\s(?P<Journal>.+?),.*?\sv\.(?P<Issue>[0-9]+),.*?\s(?P<Year>(?:19|20)[0-9]{2})'
+CITATION_NO_ISSUE = r'"(?P<Title>.+),".*?\s(?P<Journal>.+?),.*?\s(?P<Year>(?:19|20)[0-9]{2})'
+CITATION_PATTERNS = [(CITATION, CITATION_NO_ISSUE),
+                     (CITATION.replace('"', "'"), CITATION_NO_ISSUE.replace('"', "'"))]
+DOI = r'(?i)(?:doi:?\s*|doi\.org/)(?P<DOI>10\.[0-9]{4,9}/\S+)'
+
+def parse_citations(citations):
+    '''
+    Split citations into Title, Journal, Issue (the volume), Year and DOI
+    columns; unparsed fields are ''.
+    '''
+
+    citations = pd.Series(citations, dtype=object).fillna('').astype(str)
+    parts = pd.DataFrame(np.nan, index=citations.index, columns=['Title', 'Journal', 'Issue', 'Year'], dtype=object)
+    for with_issue, no_issue in CITATION_PATTERNS:
+        miss = parts['Title'].isna()
+        parts.loc[miss] = citations[miss].str.extract(with_issue).to_numpy()
+        miss = parts['Title'].isna()
+        parts.loc[miss, ['Title', 'Journal', 'Year']] = citations[miss].str.extract(no_issue).to_numpy()
+    parts['DOI'] = citations.str.extract(DOI)['DOI'].str.rstrip('.,;')
+    return parts.fillna('')
+
+def citation_split(file, output_file=None, processes=None, chunksize=50000):
     '''
-    Split manually copied citations from NSF into components: title, journal, issue, year.
+    Split manually copied citations from NSF into components: title, journal,
+    issue, year, and DOI. Large exports can be split into chunks parsed by
+    several processes.
     '''
 
-    data = pd.read_csv('..\\Data\\' + file)
-    ssplit = []
-    for s in data['Citation'].to_list():
-        try: # with issue
-            ssplit.append(re.search(r'\'(.+?),\'.*?\s(.+?),.*?\sv.([0-9]+),.*?\s(20[0-9]{2})', s).groups())
-        except AttributeError: # no issue
-            try:
-                temp = list(re.search(r'\'(.+),\'.*?\s(.+?),.*?\s(20[0-9]{2})', s).groups())
-                temp.insert(2,'')
-                ssplit.append(temp)
-            except:
-                ssplit.append(['']*4)
-    pd.concat([data,
-               pd.DataFrame.from_records(ssplit, columns=['Title', 'Journal', 'Issue', 'Year'])],
-              axis=1).to_csv(file, index=False)
+    data = pd.read_csv(str(DATA / file))
+    citations = data['Citation']
+    if processes and processes > 1 and len(citations) > chunksize:
+        chunks = [citations.iloc[i:i + chunksize] for i in range(0, len(citations), chunksize)]
+        with ProcessPoolExecutor(processes) as pool:
+            parts = pd.concat(pool.map(parse_citations, chunks))
+    else:
+        parts = parse_citations(citations)
+    pd.concat([data.drop(columns=[c for c in parts.columns if c in data.columns]),
+               parts.set_axis(data.index)],
+              axis=1).to_csv(output_file or file, index=False)
+
+MAX_QUERY_LENGTH = 3000 # characters per batched OR query
+MAX_BATCH_TITLES = 25
+MATCH_THRESHOLD = 0.9 # title similarity needed to accept a batched match
+
+def _fold(s):
+    return ' '.join(simple_string(str(s)).split())
+
+def match_scores(title, journal, result_df):
+    '''
+    Similarity (0-1) of every record in result_df to a citation's title and
+    journal, weighting title 0.8 and journal 0.2. Also returns the title
+    similarities.
+    '''
+
+    title, journal = _fold(title), _fold(journal)
+    t = np.array([SequenceMatcher(None, title, _fold(s)).ratio() for s in result_df['title']])
+    j = np.array([SequenceMatcher(None, journal, _fold(s)).ratio() for s in result_df['publication_name']])
+    return 0.8 * t + 0.2 * j, t
+
+def _title_clause(row):
+    return 'TITLE("' + _fold(getattr(row, 'Title')) + '")'
+
+def _doi_clause(row):
+    doi = getattr(row, 'DOI')
+    return 'DOI("' + doi + '")' if '(' in doi else 'DOI(' + doi + ')'
+
+def _or_batches(rows, clause_fn):
+    '''
+    Group rows into clause OR clause ... queries within MAX_QUERY_LENGTH.
+    '''
 
-def pull_manual(input_file, output_file):
+    batch, query = [], ''
+    for row in rows:
+        clause = clause_fn(row)
+        if batch and (len(query) + len(clause) + 4 > MAX_QUERY_LENGTH or len(batch) == MAX_BATCH_TITLES):
+            yield batch, query
+            batch, query = [], ''
+        batch.append(row)
+        query = query + ' OR ' + clause if query else clause
+    if batch:
+        yield batch, query
+
+@METRICS.staged('pull_manual')
+def pull_manual(input_file, output_file, load=True, batch=True):
     '''
     Pull Scopus records for articles in '_manual.csv' files and output records.
+    With batch, citations with a DOI are first looked up by exact DOI, and
+    titles are then looked up many at a time with OR queries
+    and the results are matched back to rows by title and journal
+    similarity; only unmatched rows are searched one by one, falling back
+    from title and journal, to title, to full citation. Each record gets a
+    match_score and the match_tier that found it. Searches run concurrently
+    and matches are streamed to output_file. Finished rows are kept in a
+    progress journal under their unique_id and a hash of their citation
+    fields, so a restarted pull skips them, and starts over if the input no
+    longer has them; rows that failed on a transport or server error are not
+    kept, so it retries them. Returns the records, or just output_file if
+    load is False.
     '''
 
-    data = pd.read_csv('..\\Data\\' + input_file, encoding='utf8', dtype=str)
-    docs, error = [], []
-    i = 0
+    data = pd.read_csv(str(DATA / input_file), encoding='utf8', dtype=str)
+    if 'DOI' not in data.columns:
+        data['DOI'] = parse_citations(data['Citation'])['DOI'].to_numpy()
+    data['DOI'] = data['DOI'].fillna('')
+    journal, f = _open_output(output_file)
     print('Starting... Pull records for', output_file)
-    for row in data.itertuples():
+
+    def unique_id(row):
         try:
-            unique_id = getattr(row, 'unique_id')
+            return getattr(row, 'unique_id')
         except:
-            unique_id = str(getattr(row, 'IR_ID')) + ', ' + str(getattr(row, 'ID'))
+            return str(getattr(row, 'IR_ID')) + ', ' + str(getattr(row, 'ID'))
+
+    def row_key(row):
+        fields = [str(getattr(row, col, '')) for col in ['Citation', 'Title', 'Journal', 'DOI']]
+        return str(unique_id(row)) + ' ' + hashlib.sha1('\n'.join(fields).encode('utf8')).hexdigest()[:16]
+
+    # Journaled rows that are no longer in the input were pulled from a
+    # different parse; their records cannot be told apart, so start over
+    stale = set(journal.done) - {row_key(row) for row in data.itertuples()}
+    if stale:
+        print('{} journaled rows no longer match {}, pulling again.'.format(len(stale), input_file))
+        journal.reset()
+        _rewind(f, 0)
+    if len(journal): print('Resuming, {} rows already done.'.format(len(journal)))
+
+    def write(row, result_df, tier):
+        scores, _ = match_scores(getattr(row, 'Title'), getattr(row, 'Journal'), result_df)
+        result_df = result_df.iloc[[scores.argmax()]]
+        result_df['unique_id'] = unique_id(row)
+        result_df['match_score'] = scores.max()
+        result_df['match_tier'] = tier
+        journal.record(row_key(row), _write_chunk(f, result_df))
+        METRICS.inc('pull_records_total')
+        METRICS.inc('pull_manual_tier_hits_total', tier=tier)
+
+    rows = [row for row in data.itertuples() if row_key(row) not in journal]
+
+    # Batched exact DOI search for citations that give a DOI
+    if batch:
+        doi_rows = [row for row in rows if getattr(row, 'DOI')]
+        METRICS.inc('pull_manual_tier_attempts_total', len(doi_rows), tier='doi')
+        batches = list(_or_batches(doi_rows, _doi_clause))
+        found = CLIENT.map(lambda b: list(search(None, b[1])), batches)
+        for (batch_rows, query), pages in zip(batches, found):
+            pages = [result_df for result_df, _ in pages if type(result_df) != str]
+            if not pages:
+                continue
+            result_df = pd.concat(pages, ignore_index=True)
+            dois = result_df['doi'].fillna('').str.lower().to_numpy()
+            for row in batch_rows:
+                hits = np.flatnonzero(dois == getattr(row, 'DOI').lower())
+                if len(hits):
+                    write(row, result_df.iloc[hits], 'doi')
+        matched = sum(row_key(row) in journal for row in doi_rows)
+        print('DOI search matched {} of {} rows in {} queries.'.format(matched, len(doi_rows), len(batches)))
+        rows = [row for row in rows if row_key(row) not in journal]
+
+    for row in rows:
         if type(getattr(row, 'Title')) == float:
-            error.append((unique_id, getattr(row, 'Citation'), 'docs', 'Citation missing title'))
-            continue
+            journal.record(row_key(row), f.tell(), error=(unique_id(row), getattr(row, 'Citation'), 'docs', 'Citation missing title'))
+    rows = [row for row in rows if row_key(row) not in journal]
+
+    # Batched title search, only titles long enough to be selective
+    if batch:
+        batchable = [row for row in rows if len(_fold(getattr(row, 'Title')).split()) >= 3]
+        METRICS.inc('pull_manual_tier_attempts_total', len(batchable), tier='batch')
+        batches = list(_or_batches(batchable, _title_clause))
+        # Read at most about 3 candidates per title; the rest fall back
+        found = CLIENT.map(lambda b: list(islice(search(None, b[1]), -(-3 * len(b[0]) // 25))), batches)
+        for i, ((batch_rows, query), pages) in enumerate(zip(batches, found)):
+            if i % 10 == 0: print('Batch {}, remaining quota: {}'.format(i, pages[-1][1] if pages else None))
+            pages = [result_df for result_df, _ in pages if type(result_df) != str]
+            if not pages:
+                continue
+            result_df = pd.concat(pages, ignore_index=True)
+            for row in batch_rows:
+                scores, title_scores = match_scores(getattr(row, 'Title'), getattr(row, 'Journal'), result_df)
+                if title_scores.max() >= MATCH_THRESHOLD:
+                    best = np.where(title_scores >= MATCH_THRESHOLD, scores, -1).argmax()
+                    write(row, result_df.iloc[[best]], 'batch')
+        matched = sum(row_key(row) in journal for row in batchable)
+        print('Batched search matched {} of {} rows in {} queries.'.format(matched, len(batchable), len(batches)))
+        rows = [row for row in rows if row_key(row) not in journal]
+
+    def lookup(row):
         title, journal = simple_string(getattr(row, 'Title')), simple_string(getattr(row, 'Journal'))
 
-        # Search with title and journal
-        result_df, remaining_quota = search(API_KEY, 'TITLE(' + title + ') AND SRCTITLE(' + journal + ')')
-        # if i % 9: time.sleep(0.5) # API throttle rate = 9 calls/second
-        if i % 100 == 0: print('Row ' + i + ', remaining quota:', remaining_quota)
-        i += 1
-        if type(result_df) == str:
-            # Search with title
-            result_df, remaining_quota = search(API_KEY, 'TITLE(' + title + ')')
-            if type(result_df) == str:
-                # Search with full citation
-                result_df, remaining_quota = search(API_KEY, 'ALL(' + simple_string(getattr(row, 'Citation')) + ')')
-                if type(result_df) == str:
-                    error.append([unique_id, 'docs', result_df])
-                    continue
-
-        # If found, proceed
-        result_df['unique_id'] = unique_id
-        docs.append(result_df.head(1))
-
-    docs = pd.concat(docs, axis=0, join='outer', sort=False)
-    docs.to_csv(output_file, index=False)
-    print('Success.', 'Wrote {} results to'.format(docs.shape[0]), output_file)
-    pd.DataFrame(error).to_csv('Error_' + output_file, index=False)
-    print('Wrote {} results to'.format(error.shape[0]), 'Error_' + output_file)
-    return docs
+        # Search with title and journal; only the first page is needed
+        tiers = [('title+journal', 'TITLE(' + title + ') AND SRCTITLE(' + journal + ')'),
+                 ('title', 'TITLE(' + title + ')'),
+                 ('citation', 'ALL(' + simple_string(getattr(row, 'Citation')) + ')')]
+        for tier, query in tiers:
+            METRICS.inc('pull_manual_tier_attempts_total', tier=tier)
+            result_df, remaining_quota = next(search(None, query))
+            if type(result_df) != str or not _definitive(result_df):
+                break
+        return tier, result_df, remaining_quota
+
+    # Rows that failed on a transport or server error are left out of the
+    # journal, so the next run retries them
+    failed = []
+    for i, (row, (tier, result_df, remaining_quota)) in enumerate(zip(rows, CLIENT.map(lookup, rows))):
+        if i % 100 == 0: print('Row {}, remaining quota: {}'.format(i, remaining_quota))
+        if type(result_df) == str and _definitive(result_df):
+            journal.record(row_key(row), f.tell(), error=[unique_id(row), 'docs', result_df])
+        elif type(result_df) == str:
+            failed.append([unique_id(row), 'docs', result_df])
+        else:
+            # If found, proceed
+            write(row, result_df, tier)
+    f.close()
+    journal.close()
+
+    error = journal.errors() + failed
+    METRICS.inc('pull_errors_total', len(error))
+    print('Success.', 'Wrote {} results to'.format(len(journal) - len(error) + len(failed)), output_file)
+    pd.DataFrame(error).to_csv(_error_file(output_file), index=False)
+    print('Wrote {} results to'.format(len(error)), _error_file(output_file))
+    return _finish_output(output_file, load)
 
 def format_query(row):
     '''
     Format query from interdiscplinary set for pulling comparator set.
     '''
 
-    journal_name, volume, issue = getattr(row, 'publication_name'), str(getattr(row, 'volume')), str(getattr(row, 'issue'))
+    journal_name = getattr(row, 'publication_name')
+    volume, issue = ('' if pd.isna(v) else str(v) for v in (getattr(row, 'volume'), getattr(row, 'issue')))
 
     # Some data cleaning for entries that would return error
     if '(Switzerland)' in journal_name:
@@ -337,97 +676,170 @@ def format_query(row):
         query = 'EXACTSRCTITLE(' + journal_name + ') AND VOLUME(' + volume + ') AND ISSUE(' + issue + ')'
     return query
 
-def pull_comp(data, output_file):
+@METRICS.staged('pull_comp')
+def pull_comp(data, output_file, load=True):
     '''
-    Pull comparator set and output records.
+    Pull comparator set and output records. Queries are planned first (see
+    planner.py), so each distinct query is run once and queries subsumed by
+    a broader one are answered from its records. Planned queries are run
+    concurrently through the shared client, a bounded number at a time, and
+    their pages are streamed to output_file with the originating query.
+    Finished queries are kept in a progress journal, so a restarted pull
+    skips them; queries that failed on a transport or server error are not,
+    so it retries them. Returns the records, or just output_file if load is
+    False.
     '''
 
-    comp_docs, comp_error = [], []
-    i = 0
+    plan = QueryPlan(data['query'])
+    journal, f = _open_output(output_file)
+    nrow = 0
     print('Starting... Pull cited-by records for ' + output_file)
-    for query in data['query']:
-        result_df, remaining_quota = search(API_KEY, query)
-        # if i % 9: time.sleep(0.5) # API throttle rate = 9 calls/second
-        if i % 100 == 0: print('Row ' + i + ', remaining quota:', remaining_quota)
-        i += 1
-        if type(result_df) == str:
-            comp_error.append((query, result_df))
-        else:
-            result_df['query'] = query
-            comp_docs.append(result_df)
-    comp_docs = pd.concat(comp_docs, axis=0, join='outer', sort=False)
-    comp_docs.to_csv(output_file, index=False)
-    print('Success.', 'Wrote {} results to'.format(comp_docs.shape[0]), output_file)
-    pd.DataFrame(comp_error, columns=['query', 'error_info']).to_csv('Error_' + output_file, index=False)
-    print('Wrote {} results to'.format(comp_error.shape[0]), 'Error_' + output_file)
-    return comp_docs
-
-def pull_cited(data, output_file):
+    plan.report()
+    if len(journal): print('Resuming, {} queries already done.'.format(len(journal)))
+    todo = [q for q in plan.runs if q not in journal]
+    failed = []
+    for i, (run, pages) in enumerate(CLIENT.stream(lambda q: search(None, q), todo)):
+        start, rows, error, remaining_quota = f.tell(), 0, None, None
+        for result_df, remaining_quota in pages:
+            if type(result_df) == str:
+                error = result_df
+                continue
+            for query, records in plan.fan_out(run, result_df):
+                if len(records):
+                    _write_chunk(f, records.assign(query=query))
+                    rows += records.shape[0]
+        if i % 100 == 0: print('Row {}, remaining quota: {}'.format(i, remaining_quota))
+        if error is not None:
+            # Drop the pages before the error; only Scopus's own answers are
+            # journaled, so the next run retries the query
+            _rewind(f, start)
+            if _definitive(error):
+                journal.record(run, f.tell(), error=[(q, error) for q in plan.targets[run]])
+            else:
+                failed += [(q, error) for q in plan.targets[run]]
+            continue
+        nrow += rows
+        METRICS.inc('pull_records_total', rows)
+        journal.record(run, f.tell())
+    f.close()
+    journal.close()
+
+    print('Success.', 'Wrote {} results to'.format(nrow), output_file)
+    comp_error = [e for errors in journal.errors() for e in errors] + failed
+    METRICS.inc('pull_errors_total', len(comp_error))
+    pd.DataFrame(comp_error, columns=['query', 'error_info']).to_csv(_error_file(output_file), index=False)
+    print('Wrote {} results to'.format(len(comp_error)), _error_file(output_file))
+    return _finish_output(output_file, load)
+
+@METRICS.staged('pull_cited')
+def pull_cited(data, output_file, load=True):
     '''
     Pull cited-by articles for articles in datasets and output records.
+    Searches run concurrently, a bounded number at a time, pause when every
+    API key is exhausted, and their pages are streamed to output_file.
+    Finished EIDs are kept in a progress journal, so a restarted pull skips
+    them; EIDs that failed on a transport or server error are not, so it
+    retries them. Returns the records, or just output_file if load is
+    False.
     '''
 
-    cited = []
     eids = data['eid'].to_list()
-    if 'unique_id' in data.columns:
-        uniq_id = True
-        unique_ids = data['unique_id'].to_list()
-
-    print('Starting... Pull cited-by records for ' + output_file)
+    uniq_id = 'unique_id' in data.columns
+    unique_ids = defaultdict(list)
     for i in range(len(eids)):
-        # if i % 9: time.sleep(0.5) # API throttle rate = 9 calls/second
-        cited_df, remaining_quota = search(API_KEY, 'REFEID(' + eids[i] + ')')
-        if type(cited_df) != str:
-            if uniq_id:
-                cited_df['award_id'] = re.search(r'(\d+)', unique_ids[i]).group()
-                cited_df['unique_id'] = unique_ids[i]
-            cited_df['EID'] = eids[i]
-            cited.append(cited_df)
-        if i % 100 == 0: print('Row ' + i + ', remaining quota:', remaining_quota)
-        if remaining_quota == 0:
-            print('Stopped at row ' + i + '.')
-            break
-    cited_docs = pd.concat(cited, axis=0, join='outer', sort=False)
-    cited_docs.to_csv(output_file, index=False)
-    print('Success.', 'Wrote {} results to'.format(cited_docs.shape[0]), output_file)
-    error = pd.DataFrame(set(eids) - set(cited_docs.EID), columns=['error'])
-    error.to_csv('Error_' + output_file, index=False)
-    print('Wrote {} results to'.format(error.shape[0]), 'Error_' + output_file)
-    return cited_docs
+        unique_ids[eids[i]].append(data['unique_id'].iloc[i] if uniq_id else None)
+    journal, f = _open_output(output_file)
+    nrow = 0
+    print('Starting... Pull cited-by records for ' + output_file)
+    if len(journal): print('Resuming, {} EIDs already done.'.format(len(journal)))
+    todo = [eid for eid in unique_ids if eid not in journal]
+    failed = []
+    for i, (eid, pages) in enumerate(CLIENT.stream(lambda eid: search(None, 'REFEID(' + eid + ')'), todo)):
+        start, rows, error, remaining_quota = f.tell(), 0, None, None
+        for cited_df, remaining_quota in pages:
+            if type(cited_df) == str:
+                error = cited_df
+                continue
+            for unique_id in unique_ids[eid]:
+                if uniq_id:
+                    cited_df['award_id'] = re.search(r'(\d+)', unique_id).group()
+                    cited_df['unique_id'] = unique_id
+                cited_df['EID'] = eid
+                _write_chunk(f, cited_df)
+                rows += cited_df.shape[0]
+        if i % 100 == 0: print('Row {}, remaining quota: {}'.format(i, remaining_quota))
+        if error is not None:
+            # Drop the pages before the error; only Scopus's own answers are
+            # journaled, so the next run retries the EID
+            _rewind(f, start)
+            if _definitive(error):
+                journal.record(eid, f.tell(), error=eid)
+            else:
+                failed.append(eid)
+            continue
+        nrow += rows
+        METRICS.inc('pull_records_total', rows)
+        journal.record(eid, f.tell())
+    f.close()
+    journal.close()
+
+    print('Success.', 'Wrote {} results to'.format(nrow), output_file)
+    error = pd.DataFrame(journal.errors() + failed, columns=['error'])
+    METRICS.inc('pull_errors_total', error.shape[0])
+    error.to_csv(_error_file(output_file), index=False)
+    print('Wrote {} results to'.format(error.shape[0]), _error_file(output_file))
+    return _finish_output(output_file, load)
+
+def _lookup(table, keys):
+    '''
+    Positions of keys in table's index, -1 where missing. Each distinct key
+    is looked up once.
+    '''
+
+    codes, uniques = pd.factorize(keys)
+    return np.append(table.index.get_indexer(uniques), -1)[codes]
 
 def map_fields(df, cited=False, source_df=None):
     '''
     Map Field and Quartile, and Source (original article Field), Cross/Intra,
-    and Citation Type for cited-by articles.
+    and Citation Type for cited-by articles. Journals are resolved by ISSN,
+    title or fuzzy title (see journal_index.py), with the tier and confidence in
+    JournalMatch and JournalScore. ISSNs are learned from df only, not into
+    the shared index, so the result does not depend on what was mapped
+    before. Each mapping is one vectorized lookup; Field and Quartile are
+    categorical.
     '''
 
-    if not cited:
-        df['Field'] = df['publication_name'].str.lower().map(fields)
-        df['Quartile'] = df['publication_name'].str.lower().map(quartile)
-        df['CiteScore'] = df['publication_name'].str.lower().map(citescore)
-    else:
-        eid_dict = dict(zip(source_df.eid, source_df.Field))
-        df['Source'] = df['EID'].map(eid_dict)
-        eid_dict = dict(zip(source_df.eid, source_df.Quartile))
-        df["SourceQuartile"] = df["EID"].map(eid_dict)
-        df['CrossIntra'] = df.apply(lambda row: 'Intra' if getattr(row, 'Source') == getattr(row, 'Field') else 'Cross', axis=1)
-        df['CiteType'] = df.apply(lambda row: getattr(row, 'CrossIntra') + ' ' + getattr(row, 'Source'), axis=1)
+    journals, index = get_journals()
+    resolved = index.resolve(df)
+    pos = resolved['pos'].to_numpy()
+    for col in ['Field', 'Quartile', 'CiteScore']:
+        df[col] = journals[col].array.take(pos, allow_fill=True)
+    df['JournalMatch'] = resolved['JournalMatch'].to_numpy()
+    df['JournalScore'] = resolved['JournalScore'].to_numpy()
+    if cited:
+        sources = source_df.drop_duplicates('eid', keep='last').set_index('eid')
+        pos = _lookup(sources, df['EID'])
+        df['Source'] = sources['Field'].astype(journals['Field'].dtype).array.take(pos, allow_fill=True)
+        df['SourceQuartile'] = sources['Quartile'].astype(journals['Quartile'].dtype).array.take(pos, allow_fill=True)
+        df['CrossIntra'] = np.where(df['Source'] == df['Field'], 'Intra', 'Cross')
+        df['CiteType'] = df['CrossIntra'].str.cat(df['Source'].astype(str).where(df['Source'].notna()), sep=' ')
     return df
 
-def clean_data(df, dataset, cited=False, source_df=None):
+def clean_data(df, dataset, cited=False, source_df=None, min_fuzzy_score=0.85):
     '''
     Drop duplicates based on eid, map field and quartile, and remove rows with
-    non-journal/trade journal aggregation type and unidentified field and
-    quartile
+    non-journal/trade journal aggregation type, unidentified field and
+    quartile, or a fuzzy journal match scoring below min_fuzzy_score
     '''
 
     if not cited:
         df = df.drop_duplicates('eid')
-    df = map_fields(df)
+    df = map_fields(df, cited, source_df)
+    weak = ((df.JournalMatch == 'fuzzy') & (df.JournalScore < min_fuzzy_score)).to_numpy()
+    if weak.any(): print('Dropping {} rows with a weak fuzzy journal match.'.format(weak.sum()))
     df = df[(df.aggregation_type.isin(['Journal', 'Trade Journal'])) & \
                   (df.Field.isin(['NS', 'EC', 'Other', 'GI'])) & \
-                  (df.Quartile.isin(['Quartile 1', 'Quartile 2', 'Quartile 3', 'Quartile 4']))]
-    if cited:
-        df = map_fields(df, cited, source_df)
-    df['Dataset'] = dataset
+                  (df.Quartile.isin(['Quartile 1', 'Quartile 2', 'Quartile 3', 'Quartile 4'])) & ~weak]
+    df['Dataset'] = pd.Categorical.from_codes(np.zeros(len(df), dtype=int), [dataset])
     return df
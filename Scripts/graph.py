@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+'''
+Date: Sun Oct 18, 2026
+Purpose: This script builds the citation graph of the pulled cited-by sets:
+    a compressed sparse row (CSR) adjacency from each source article (EID) to
+    the articles citing it, with Field, Quartile and Dataset codes per article
+    and the award ids of source articles. The cross/intra-field shares per
+    award and field-to-field flows of Data_Analysis_v1.ipynb, and the
+    second-order citation reach, are computed with bincounts and sparse
+    products over the edge arrays instead of merging the cited-by tables.
+    Graphs save to a compressed .npz file, with Scopus EIDs stored as
+    integers.
+'''
+
+import numpy as np, pandas as pd, re
+from scipy import sparse
+
+
+EID_PREFIX = '2-s2.0-'
+NODE_ATTRS = ['Field', 'Quartile', 'Dataset']
+
+
+def _encode_eids(eids):
+    '''
+    EIDs as int64 when all are Scopus '2-s2.0-<digits>' ids, else as strings.
+    '''
+
+    eids = pd.Series(np.asarray(eids, dtype=str))
+    if len(eids) and eids.str.fullmatch(re.escape(EID_PREFIX) + r'\d{1,18}').all():
+        return eids.str[len(EID_PREFIX):].astype(np.int64).to_numpy()
+    return eids.to_numpy(dtype=str)
+
+def _decode_eids(eids):
+    return np.char.add(EID_PREFIX, eids.astype(str)) if eids.dtype.kind == 'i' else eids.astype(object)
+
+
+class CitationGraph:
+    '''
+    CSR citation graph. Node i's citing articles are
+    indices[indptr[i]:indptr[i + 1]]; attrs holds one categorical per node
+    attribute and award_nodes/award_codes pair source nodes with awards.
+    '''
+
+    def __init__(self, eids, indptr, indices, attrs, award_nodes, award_codes, awards):
+        self.eids = pd.Index(eids)
+        self.indptr, self.indices = indptr, indices
+        self.attrs = attrs
+        self.award_nodes, self.award_codes, self.awards = award_nodes, award_codes, pd.Index(awards)
+
+    @classmethod
+    def from_records(cls, sources, cited, award_col='award_id'):
+        '''
+        Build from source articles (eid, Field, Quartile, Dataset and
+        optionally award_id, one row per article and award) and their cited-by
+        records (eid of the citing article, EID of the source, Field and
+        Quartile of the citing article, optionally award_id).
+        '''
+
+        codes, eids = pd.factorize(np.concatenate([sources['eid'].astype(str).to_numpy(),
+                                                   cited['EID'].astype(str).to_numpy(),
+                                                   cited['eid'].astype(str).to_numpy()]))
+        n = len(eids)
+        of_sources, of_cited, of_citing = np.split(codes, [len(sources), len(sources) + len(cited)])
+
+        # Duplicate edges (a source pulled once per award) are kept once
+        edges = np.unique(of_cited.astype(np.int64) * n + of_citing)
+        src, dst = edges // n, (edges % n).astype(np.int32)
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+
+        # Field and Quartile of citing articles, overridden by those of
+        # sources. Dataset in cited-by records is the source's, so only
+        # sources have one.
+        attrs = {}
+        for col in NODE_ATTRS:
+            frames = [(cited, of_citing)] if col != 'Dataset' else []
+            frames = [(df, at) for df, at in frames + [(sources, of_sources)] if col in df]
+            values = [df[col].astype(str).where(df[col].notna()) for df, _ in frames]
+            categories = pd.unique(pd.concat(values).dropna()) if values else []
+            node_codes = np.full(n, -1, dtype=np.int16)
+            for (_, at), v in zip(frames, values):
+                node_codes[at] = pd.Categorical(v, categories).codes
+            attrs[col] = pd.Categorical.from_codes(node_codes, categories)
+
+        pairs = [pd.DataFrame({'node': at, 'award': df[award_col].to_numpy()})
+                 for df, at in ((sources, of_sources), (cited, of_cited)) if award_col in df]
+        pairs = pd.concat(pairs).dropna().astype({'award': str}).drop_duplicates() if pairs else pd.DataFrame({'node': [], 'award': []})
+        award_codes, awards = pd.factorize(pairs['award'].astype(str))
+        return cls(eids, indptr, dst, attrs, pairs['node'].to_numpy(dtype=np.int64), award_codes, awards)
+
+    def __len__(self):
+        return len(self.eids)
+
+    @property
+    def n_edges(self):
+        return len(self.indices)
+
+    def citing(self, eid):
+        '''
+        EIDs of the articles citing eid.
+        '''
+
+        i = self.eids.get_loc(eid)
+        return self.eids[self.indices[self.indptr[i]:self.indptr[i + 1]]]
+
+    def out_degree(self):
+        return np.diff(self.indptr)
+
+    def edge_sources(self):
+        '''
+        Source node of every edge, aligned with indices.
+        '''
+
+        return np.repeat(np.arange(len(self.eids)), self.out_degree())
+
+    def edge_frame(self):
+        '''
+        Edges with the coded attributes of the notebook's cited-by tables:
+        Source and Field (of the citing article), SourceQuartile and Quartile,
+        Dataset of the source and CrossIntra, as categoricals.
+        '''
+
+        src, dst = self.edge_sources(), self.indices
+        field, quartile = self.attrs['Field'], self.attrs['Quartile']
+        f_src, f_dst = field.codes[src], field.codes[dst]
+        return pd.DataFrame({'Source': pd.Categorical.from_codes(f_src, field.categories),
+                             'Field': pd.Categorical.from_codes(f_dst, field.categories),
+                             'SourceQuartile': pd.Categorical.from_codes(quartile.codes[src], quartile.categories),
+                             'Quartile': pd.Categorical.from_codes(quartile.codes[dst], quartile.categories),
+                             'Dataset': pd.Categorical.from_codes(self.attrs['Dataset'].codes[src], self.attrs['Dataset'].categories),
+                             'CrossIntra': pd.Categorical.from_codes(((f_src == f_dst) & (f_src >= 0)).astype(np.int8),
+                                                                     ['Cross', 'Intra'])})
+
+    def _edge_codes(self, by):
+        edges = self.edge_frame()
+        codes, sizes, names = [], [], []
+        for col in by:
+            codes.append(edges[col].cat.codes.to_numpy().astype(np.int64))
+            sizes.append(len(edges[col].cat.categories))
+            names.append(edges[col].cat.categories)
+        return codes, sizes, names
+
+    def flows(self, by=('Dataset', 'Source', 'Field')):
+        '''
+        Edge counts for every combination of the edge attributes in by, e.g.
+        the field-to-field flow matrix per dataset. Edges with a missing
+        attribute are left out.
+        '''
+
+        codes, sizes, names = self._edge_codes(by)
+        ok = np.all([c >= 0 for c in codes], axis=0) if codes else np.ones(self.n_edges, dtype=bool)
+        flat = np.ravel_multi_index([c[ok] for c in codes], sizes)
+        counts = np.bincount(flat, minlength=int(np.prod(sizes)))
+        index = pd.MultiIndex.from_product(names, names=list(by))
+        return pd.Series(counts, index=index, name='count')
+
+    def flow_matrix(self, dataset=None, normalize=False):
+        '''
+        Source field x citing field edge counts, or row shares with
+        normalize, for one dataset or all.
+        '''
+
+        if dataset is None:
+            flows = self.flows(('Source', 'Field'))
+        else:
+            flows = self.flows(('Dataset', 'Source', 'Field')).xs(dataset, level='Dataset')
+        matrix = flows.unstack('Field')
+        return matrix.div(matrix.sum(axis=1), axis=0) if normalize else matrix
+
+    def award_shares(self, by=('CrossIntra',)):
+        '''
+        Mean over awards of each award's share of citations, as the award
+        tables of the notebook: citations are counted per (Dataset, award,
+        *by), divided by their total over the last attribute in by, and
+        averaged over the awards with citations in that cell. A source with
+        several awards counts for each.
+        '''
+
+        codes, sizes, names = self._edge_codes(by)
+        ok = np.all([c >= 0 for c in codes], axis=0)
+        n_cells = int(np.prod(sizes))
+        cell = np.ravel_multi_index([c[ok] for c in codes], sizes)
+
+        # Citations per (node, cell), then per (dataset, award, cell) as the
+        # product with the (dataset, award) x node membership matrix
+        h = sparse.csr_matrix((np.ones(len(cell)), (self.edge_sources()[ok], cell)), shape=(len(self.eids), n_cells))
+        dataset = self.attrs['Dataset'].codes.astype(np.int64)[self.award_nodes]
+        keep = dataset >= 0
+        groups, group_of = np.unique(dataset[keep] * len(self.awards) + self.award_codes[keep], return_inverse=True)
+        g = sparse.csr_matrix((np.ones(keep.sum()), (group_of, self.award_nodes[keep])), shape=(len(groups), len(self.eids)))
+        counts = (g @ h).tocoo()
+
+        table = pd.DataFrame({'Dataset': groups[counts.row] // len(self.awards), 'award': groups[counts.row] % len(self.awards)})
+        for col, c in zip(by, np.unravel_index(counts.col, sizes)):
+            table[col] = c
+        table['count'] = counts.data
+        table['share'] = table['count'] / table.groupby(['Dataset', 'award'] + list(by[:-1]))['count'].transform('sum')
+        result = table.groupby(['Dataset'] + list(by))['share'].mean().reset_index()
+        result['Dataset'] = self.attrs['Dataset'].categories[result['Dataset']]
+        for col, n in zip(by, names):
+            result[col] = n[result[col]]
+        return result
+
+    def adjacency(self):
+        '''
+        Adjacency as a scipy CSR matrix (source x citing).
+        '''
+
+        data = np.ones(self.n_edges, dtype=np.int32)
+        return sparse.csr_matrix((data, self.indices, self.indptr), shape=(len(self.eids), len(self.eids)))
+
+    def reach(self, eids=None, order=2):
+        '''
+        Number of distinct articles citing each article within order steps,
+        e.g. its citing articles and the articles citing those. Only citing
+        articles whose own cited-by records were pulled add a second step.
+        '''
+
+        rows = np.arange(len(self.eids)) if eids is None else self.eids.get_indexer(eids)
+        a = self.adjacency()
+        frontier = reached = a[rows]
+        for _ in range(order - 1):
+            frontier = frontier @ a
+            reached = reached + frontier
+        return pd.Series(np.diff(reached.indptr), index=self.eids[rows], name='reach')
+
+    def save(self, file):
+        '''
+        Save to a compressed .npz file.
+        '''
+
+        arrays = {'eids': _encode_eids(self.eids), 'indptr': self.indptr, 'indices': self.indices,
+                  'award_nodes': self.award_nodes, 'award_codes': self.award_codes,
+                  'awards': np.asarray(self.awards, dtype=str)}
+        for col, values in self.attrs.items():
+            arrays[col + '_codes'] = values.codes
+            arrays[col + '_categories'] = np.asarray(values.categories, dtype=str)
+        np.savez_compressed(file, **arrays)
+
+    @classmethod
+    def load(cls, file):
+        with np.load(file) as f:
+            attrs = {col: pd.Categorical.from_codes(f[col + '_codes'], f[col + '_categories'].astype(object))
+                     for col in NODE_ATTRS}
+            return cls(_decode_eids(f['eids']), f['indptr'], f['indices'], attrs,
+                       f['award_nodes'], f['award_codes'], f['awards'].astype(object))
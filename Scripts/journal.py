@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+'''
+Date: Sun Oct 18, 2026
+Purpose: This script provides a durable progress journal for the pull_*
+    functions. Every finished row is appended to a JSON lines file together
+    with its error, if Scopus answered with one (e.g. an empty result), the
+    time it finished, and the size of the output file after its records were
+    written. A restarted pull truncates the output back to the last
+    journaled size and skips rows that already completed. Rows that failed
+    on a transport or server error are not journaled, so they are retried.
+'''
+
+import json, os
+from datetime import datetime
+
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+class ProgressJournal:
+    '''
+    Append-only journal of completed rows, keyed by a string row key.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+        self.offset = 0
+        if os.path.exists(path):
+            with open(path, encoding='utf8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError: # partially written last line
+                        continue
+                    self.done[entry['key']] = entry
+                    self.offset = entry['offset']
+        self.f = open(path, 'a', encoding='utf8')
+
+    def __contains__(self, key):
+        return key in self.done
+
+    def __len__(self):
+        return len(self.done)
+
+    def record(self, key, offset, error=None):
+        '''
+        Durably mark key as completed, with its records written up to offset
+        in the output file.
+        '''
+
+        entry = {'key': key, 'offset': offset, 'error': error, 'time': _now()}
+        self.f.write(json.dumps(entry, default=str) + '\n')
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.done[key] = entry
+        self.offset = offset
+
+    def rewrite(self, offset, keys=()):
+        '''
+        Replace the journal after its output was rewritten as a whole (see
+        refresh.py): every completed row, and every key in keys, now ends
+        at offset.
+        '''
+
+        for key in keys:
+            self.done.setdefault(key, {'key': key, 'offset': offset, 'error': None, 'time': _now()})
+        for entry in self.done.values():
+            entry['offset'] = offset
+        self.f.close()
+        with open(self.path + '.tmp', 'w', encoding='utf8') as f:
+            for entry in self.done.values():
+                f.write(json.dumps(entry, default=str) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self.path + '.tmp', self.path)
+        self.f = open(self.path, 'a', encoding='utf8')
+        self.offset = offset
+
+    def reset(self):
+        '''
+        Forget all completed rows.
+        '''
+
+        self.f.truncate(0)
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.done = {}
+        self.offset = 0
+
+    def errors(self):
+        return [entry['error'] for entry in self.done.values() if entry['error'] is not None]
+
+    def close(self):
+        self.f.close()
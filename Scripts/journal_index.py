@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+'''
+Date: Sun Oct 18, 2026
+Purpose: This script provides the journal resolution index used to map
+    Scopus records onto journalmapping.csv. Records are matched on ISSN or
+    E-ISSN first, then on the exact lower-cased title, then on a folded title
+    key (ascii, '&' as 'and', no punctuation or leading 'the', with and
+    without subtitle), and last on character trigram similarity. A fuzzy
+    match must score at least 0.8 and its words must agree with the title's
+    up to spelling, so e.g. 'Journal of Urban Ecology' does not match
+    'Journal of Ecology'. Every match carries its tier and a confidence
+    score.
+    journalmapping.csv has no ISSNs, so ISSNs are learned from the records
+    of each resolve() call that resolve by title, or can be given as a table
+    (e.g. from the Scopus source list).
+'''
+
+import numpy as np, pandas as pd, re, string, unidecode
+from difflib import SequenceMatcher
+
+
+PUNCTUATION = str.maketrans(string.punctuation, ' ' * len(string.punctuation))
+STOPWORDS = {'a', 'an', 'and', 'de', 'des', 'du', 'et', 'for', 'in', 'la', 'of', 'on', 'the', 'und'}
+
+
+def normalize_title(s):
+    '''
+    Fold a journal title into a lookup key.
+    '''
+
+    s = unidecode.unidecode(s).lower().replace('&', ' and ').translate(PUNCTUATION)
+    words = s.split()
+    if words[:1] == ['the']:
+        words = words[1:]
+    return ' '.join(words)
+
+def main_title(s):
+    '''
+    Title without subtitle or parenthetical, e.g. 'Sustainability
+    (Switzerland)' -> 'Sustainability'.
+    '''
+
+    return re.split(r'[:(]| - ', s)[0]
+
+def normalize_issn(s):
+    '''
+    ISSN as 8 upper case characters without hyphen, or None.
+    '''
+
+    if s is None or pd.isna(s) or s == '':
+        return None
+    if isinstance(s, float):
+        s = int(s)
+    s = str(s).split()[0].replace('-', '').upper()
+    return s.zfill(8) if len(s) <= 8 else None
+
+def _words_agree(a, b, min_ratio=0.8):
+    '''
+    Whether every content word of folded title a has a close counterpart in
+    folded title b and the other way round, i.e. the titles differ by
+    spelling only, not by a word.
+    '''
+
+    a, b = set(a.split()) - STOPWORDS, set(b.split()) - STOPWORDS
+    def close(word, words):
+        return word in words or any(SequenceMatcher(None, word, w).ratio() >= min_ratio for w in words)
+    return all(close(w, b) for w in a) and all(close(w, a) for w in b)
+
+def _add_issns(known, issns, pos):
+    for issn, p in zip(issns, pos):
+        issn = normalize_issn(issn)
+        if issn is not None and p >= 0:
+            known.setdefault(issn, p)
+
+def _trigrams(key):
+    key = '  ' + key + ' '
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+
+class JournalIndex:
+    '''
+    Resolution index over the rows of a journal mapping table with a
+    Publication_Name column. resolve() returns row positions in that table.
+    '''
+
+    def __init__(self, mapping, issn_table=None, min_score=0.8):
+        self.min_score = min_score
+        names = mapping['Publication_Name'].astype(str)
+        self.exact = pd.Index(names.str.lower())
+        keys = names.map(normalize_title).to_numpy()
+        unique = ~pd.Series(keys).duplicated(keep=False).to_numpy()
+        self.keys, self.key_pos = pd.Index(keys[unique]), np.flatnonzero(unique)
+        mains = names.map(lambda s: normalize_title(main_title(s))).to_numpy()
+        unique = ~(pd.Series(mains).duplicated(keep=False) | pd.Series(mains).isin(keys)).to_numpy()
+        self.mains, self.main_pos = pd.Index(mains[unique]), np.flatnonzero(unique)
+        self.issns = {}
+        if issn_table is not None:
+            pos = self.exact.get_indexer(issn_table['Publication_Name'].astype(str).str.lower())
+            for col in ['issn', 'eissn']:
+                self.add_issns(issn_table[col], pos)
+
+        # Trigram inverted index for the fuzzy tier, as one array of journal
+        # positions sliced by trigram
+        self.titles = keys
+        grams = [_trigrams(k) for k in keys]
+        self.gram_count = np.array([len(g) for g in grams])
+        postings = {}
+        for i, g in enumerate(grams):
+            for gram in g:
+                postings.setdefault(gram, []).append(i)
+        self.gram_slot = {gram: i for i, gram in enumerate(postings)}
+        self.post_offsets = np.cumsum([0] + [len(p) for p in postings.values()])
+        self.post_ids = np.concatenate([np.array(p, dtype=np.int32) for p in postings.values()])
+
+    def add_issns(self, issns, pos):
+        '''
+        Remember that each ISSN belongs to the journal at the matching
+        position. Positions of -1 are ignored.
+        '''
+
+        _add_issns(self.issns, issns, pos)
+
+    def _by_issn(self, issns, known=None):
+        known = self.issns if known is None else known
+        codes, uniques = pd.factorize(pd.Series(issns).map(normalize_issn))
+        found = np.array([known.get(u, -1) for u in uniques], dtype=int)
+        return np.append(found, -1)[codes]
+
+    def _by_key(self, index, pos, keys):
+        i = index.get_indexer(keys)
+        return np.where(i >= 0, pos[np.maximum(i, 0)], -1)
+
+    def fuzzy(self, key):
+        '''
+        Best trigram (Jaccard) match for a folded title that scores at least
+        min_score and whose words agree with it: (position, score), or
+        (-1, 0.0) if there is none.
+        '''
+
+        grams = _trigrams(key)
+        slots = [self.gram_slot[g] for g in grams if g in self.gram_slot]
+        if not slots:
+            return -1, 0.0
+        hits = [self.post_ids[self.post_offsets[i]:self.post_offsets[i + 1]] for i in slots]
+        counts = np.bincount(np.concatenate(hits), minlength=len(self.gram_count))
+        scores = counts / (len(grams) + self.gram_count - counts)
+        candidates = np.flatnonzero(scores >= self.min_score)
+        for best in candidates[np.argsort(-scores[candidates], kind='stable')]:
+            if _words_agree(key, self.titles[best]):
+                return int(best), float(scores[best])
+        return -1, 0.0
+
+    def resolve(self, df, name_col='publication_name', issn_cols=('issn', 'eissn'), learn=True):
+        '''
+        Resolve every row of df. Returns a dataframe with the table position
+        (-1 if unresolved), the tier that matched and its score. Titles are
+        folded once per distinct title. With learn, ISSNs of rows matched by
+        title are used for rows of df still unresolved; they are learned for
+        this call only, so the index itself is never changed.
+        '''
+
+        n = len(df)
+        pos = np.full(n, -1)
+        match = np.full(n, None, dtype=object)
+        score = np.full(n, np.nan)
+        issn_cols = [c for c in issn_cols if c in df.columns]
+
+        def fill(tier, found, s=1.0):
+            new = (pos < 0) & (found >= 0)
+            pos[new], match[new], score[new] = found[new], tier, s if np.isscalar(s) else s[new]
+
+        for col in issn_cols:
+            fill(col, self._by_issn(df[col].to_numpy()))
+
+        codes, names = pd.factorize(df[name_col])
+        names = names.astype(str)
+        fill('exact', np.append(self.exact.get_indexer(names.str.lower()), -1)[codes])
+        keys = pd.Index([normalize_title(s) for s in names])
+        fill('normalized', np.append(self._by_key(self.keys, self.key_pos, keys), -1)[codes])
+        mains = pd.Index([normalize_title(main_title(s)) for s in names])
+        by_main = np.maximum(self._by_key(self.keys, self.key_pos, mains), self._by_key(self.mains, self.main_pos, mains))
+        fill('subtitle', np.append(by_main, -1)[codes])
+
+        if learn and issn_cols:
+            known = dict(self.issns)
+            titled = pd.Series(match).isin(['exact', 'normalized', 'subtitle']).to_numpy()
+            for col in issn_cols:
+                _add_issns(known, df[col].to_numpy()[titled], pos[titled])
+            for col in issn_cols:
+                fill(col, self._by_issn(df[col].to_numpy(), known))
+
+        todo = np.unique(codes[(pos < 0) & (codes >= 0)])
+        fuzzy_pos, fuzzy_score = np.full(len(names) + 1, -1), np.zeros(len(names) + 1)
+        for c in todo:
+            fuzzy_pos[c], fuzzy_score[c] = self.fuzzy(keys[c])
+        fill('fuzzy', fuzzy_pos[codes], fuzzy_score[codes])
+
+        return pd.DataFrame({'pos': pos, 'JournalMatch': match, 'JournalScore': score}, index=df.index)
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+'''
+Date: Sun Oct 18, 2026
+Purpose: This script provides a scheduler that spreads Scopus API calls over
+    several API keys. It tracks each key's remaining weekly quota and reset
+    time from the X-RateLimit-* response headers, always hands out the key
+    with the most quota left, and pauses until the earliest reset when every
+    key is exhausted.
+'''
+
+import threading, time
+
+
+WEEK = 7 * 24 * 3600 # Scopus quotas reset weekly
+
+
+class KeyScheduler:
+    '''
+    Hand out API keys by remaining quota. Unknown quota counts as full.
+    '''
+
+    def __init__(self, keys, quota=20000):
+        self.keys = [k for k in keys if k]
+        if not self.keys:
+            raise ValueError('No API keys given.')
+        self.quota = quota
+        self.remaining = {k: None for k in self.keys}
+        self.reset = {k: None for k in self.keys}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path='Scopus.txt', **kwargs):
+        '''
+        Read one API key per line.
+        '''
+
+        with open(path) as f:
+            return cls([line.strip() for line in f], **kwargs)
+
+    def _available(self, key, now):
+        if self.remaining[key] is None or self.remaining[key] > 0:
+            return True
+        if self.reset[key] is not None and self.reset[key] <= now:
+            self.remaining[key], self.reset[key] = None, None
+            return True
+        return False
+
+    def acquire(self):
+        '''
+        Return the key with the most quota left, sleeping until the earliest
+        reset if all keys are exhausted.
+        '''
+
+        while True:
+            with self.lock:
+                now = time.time()
+                live = [k for k in self.keys if self._available(k, now)]
+                if live:
+                    return max(live, key=lambda k: self.quota if self.remaining[k] is None else self.remaining[k])
+                wake = min(self.reset.values())
+            print('All API keys exhausted. Pausing until', time.ctime(wake))
+            time.sleep(max(wake - time.time(), 1))
+
+    def update(self, key, headers):
+        '''
+        Record quota and reset time from a response's headers.
+        '''
+
+        with self.lock:
+            try:
+                self.remaining[key] = int(headers['X-RateLimit-Remaining'])
+            except (KeyError, ValueError):
+                return
+            try:
+                self.reset[key] = float(headers['X-RateLimit-Reset'])
+            except (KeyError, ValueError):
+                if self.remaining[key] == 0 and self.reset[key] is None:
+                    self.reset[key] = time.time() + WEEK
+
+    def total_remaining(self):
+        with self.lock:
+            return sum(self.quota if r is None else r for r in self.remaining.values())
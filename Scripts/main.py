@@ -7,92 +7,185 @@ Purpose: Execution of this script will pull Scopus records for parsed
     write files containing the Scopus records (before and after cleaning) and
     search result errors.
 Notes:
-    1. Create a text file named 'Scopus.txt' with your Scopus API key as the
-        only line.
+    1. Create a text file named 'Scopus.txt' with your Scopus API key(s), one
+        per line. Calls are spread over all keys.
     This project requires a key with (1) 'COMPLETE' Scopus API access to get
         full author lists and funding fields (https://dev.elsevier.com/guides/ScopusSearchViews.htm),
         and (2) an additional access provided by Elsevier Support to get
         article cited-by lists (https://dev.elsevier.com/support.html).
     2. Scopus keys have an API limit of 20,000 queries per week. It took
-        multiple weeks to pull all these records. Suggested flow in main
-        function, but you may need to run these functions in parts when you
-        reach the API limit.
-    3. If you have a fast machine, you may need to slow down your calls to the
-        Scopus API (uncomment lines 80, 124, 149).
+        multiple weeks to pull all these records. Pulls pause when every key
+        is exhausted and keep a '.journal' file next to their output, so an
+        interrupted pull can simply be rerun and skips rows already done.
+    3. Calls to the Scopus API are throttled to 9 calls/second and retried on
+        429/5xx responses by the shared client in client.py. Adjust rate or
+        max_workers on functions.CLIENT if needed.
+    4. Result pages are cached in scopus_cache.sqlite, so rerunning this
+        script does not spend quota on queries that were already pulled. Set
+        functions.CACHE = ResponseCache(offline=True) to only read the cache.
+    5. Output files ending in '.parquet' instead of '.csv' are written as
+        compressed Parquet with list, categorical and nullable integer
+        columns (requires pyarrow). read_records reads either format.
+    6. Every API request attempt, search and pull stage is logged to
+        metrics.jsonl (latency, status, quota used, records, tiers matched),
+        and retries and rate limit waits are counted; a Prometheus snapshot
+        of the totals is written to metrics.prom at the end.
+    7. Steps run as stages of a pipeline (pipeline.py). Stage results are
+        kept in the 'pipeline' folder under a hash of their code, inputs and
+        upstream results, so rerunning this script only reruns stages that
+        changed; the comparator and cited-by pulls run in parallel.
+    8. To update citation counts and cited-by sets later, refresh.py fetches
+        only records loaded since the last fetch (refresh_cited) and counts
+        25 records per query (refresh_counts) instead of pulling again.
 
-Execution: Run script line-by-line as needed.
+Execution: python main.py, or pipeline.run([stage names]) to bring only
+    some stages up to date (force=[stage names] reruns them regardless).
 '''
 
-import pandas as pd
-from functions import pull_manual, pull_comp, pull_cited, format_query, clean_data
+import pandas as pd, functions, authors, journal_index, mapping, os, planner, sampling, zscore
+from functions import pull_manual, pull_comp, pull_cited, format_query, clean_data, write_records, citation_split, iter_records
+from authors import AuthorIndex
+from mapping import DATA
+from zscore import IssueStats
+from metrics import METRICS
+from pipeline import Pipeline
+from sampling import StratifiedSampler
 pd.options.mode.chained_assignment = None
 
+pipeline = Pipeline('pipeline')
+MANUAL = ['NSF_CNH_Articles_manual.csv', 'NSF_CNH_Post-2011_Articles_manual.csv']
+PARSED = [os.path.join(pipeline.root, f.replace('_manual', '_parsed')) for f in MANUAL]
+MAPPING = [DATA / 'journalmapping.csv']
+CLEAN = [functions, journal_index, mapping] # code of clean_data
+
 
 '''
 Process manually copied data for Scopus search.
 Files ending in '_manual.csv' originally only contained the first 2-3
 columns, NSF award identifiers and the copy/pasted citations, and these
-function calls wrote the additional parsed columns.
+function calls wrote the additional parsed columns. Parsed copies are now
+written to the pipeline folder, leaving the manual files as they are.
 '''
-# citation_split('NSF_CNH_Articles_manual.csv')
-# citation_split('NSF_CNH_Post-2011_Articles_manual.csv')
+@pipeline.stage(code=[functions], files=[DATA / f for f in MANUAL], outputs=PARSED)
+def parse_citations():
+    os.makedirs(pipeline.root, exist_ok=True)
+    for file, parsed in zip(MANUAL, PARSED):
+        citation_split(file, parsed)
+    return PARSED
 
 '''
 Pull Scopus records for CNH-funded articles. Separate by pre-/post-start
 date 01-01-2012.
 '''
-pubs = pull_manual('..\\Data\\NSF_CNH_Articles_manual.csv', 'Pubs_v1.csv')
-post_CNH = pull_manual('..\\Data\\NSF_CNH_Post-2011_Articles_manual.csv', 'Pubs_CNH_Post-2011.csv')
+@pipeline.stage(deps=['parse_citations'], code=[functions], outputs=['Pubs_v1.csv', 'Pubs_CNH_Post-2011.csv'])
+def pull_pubs(parsed):
+    pubs = pull_manual(os.path.abspath(parsed[0]), 'Pubs_v1.csv')
+    post_CNH = pull_manual(os.path.abspath(parsed[1]), 'Pubs_CNH_Post-2011.csv')
+    return pubs, post_CNH
 
 '''
 Pull comparator set and interdisciplinary cited-by articles after cleaning
 interdisciplinary set. Clean cited-by set.
 '''
-pubs_clean = clean_data(pubs, 'Interdisciplinary')
-pubs_clean['query'] = pubs_clean.apply(lambda row: format_query(row), axis=1)
-pubs_clean.to_csv('Pubs_Final.csv', index=False)
-print('Cleaned interdisciplinary set {} written to Pubs_Final.csv.'.format(len(pubs_clean) / len(pubs)))
-
-comp = pull_comp(pubs_clean, 'Comp_v1.csv')
-
-pubs_cited = pull_cited(pubs_clean, 'PubsCited_v1.csv')
-nrow = len(pubs_cited)
-pubs_cited = clean_data(pubs_cited, 'Interdisciplinary', cited=True, source_df=pubs_clean)
-pubs_cited.to_csv('PubsCited_Final.csv', index=False)
-print('Cleaned interdisciplinary set cited-by {} written to PubsCited_Final.csv.'.format(nrow / len(pubs_cited)))
-
-'''
-Sample interdisciplinary set and pulled cited-by articles after standard
-cleaning and removing all CNH2 authors NSF grants. Clean cited-by set.
-Note: Since I didn't set a seed before sampling, I read in the list I
-initially sampled instead of sampling again here.
-'''
-comp = comp[~comp.eid.isin(pubs_clean.eid)]
-nrow = len(comp)
-comp = clean_data(comp, 'Comparator')
-comp = comp[comp['fund_sponsor'] != 'National Science Foundation']
-comp = comp.query("fund_acr != 'NSF' | fund_sponsor == 'National Sleep Foundation' | fund_sponsor == 'National Stroke Foundation'")
-cnh_auths = [item for sublist in list(pubs_clean['author_ids']) + list(post_CNH['author_ids']) for item in sublist]
-comp_auths_col = comp['author_ids'].to_list()
-remove_indices = []
-for auth in comp_auths_col:
-    if [i for i in auth if i in cnh_auths]:
-        remove_indices.append(True)
-    else:
-        remove_indices.append(False)
-comp['remove'] = remove_indices
-comp = comp[~comp.remove]
-del comp['remove']
-comp.to_csv('Comp_Final.csv', index=False)
-print('Cleaned comparator set {} written to Comp_Final.csv.'.format(nrow / len(comp)))
-
-comp_sample = pd.read_csv('..\\Data\\CompSample.csv')
-# comp_sample = comp_complete.groupby(['Field', 'Quartile']).apply(lambda x: x.sample(frac=0.13)).reset_index(drop=True)
-# Check that sample has correct ratio across field/quartile groups
-# comp_sample['citation_count'] = pd.to_numeric(comp_sample.citation_count)
-# (comp_sample.groupby(['Field', 'Quartile']).count() / len(comp_sample)).scopus_id - (comp_complete.groupby(['Field', 'Quartile']).count() / len(comp_complete)).scopus_id
-comp_sample_cited = pull_cited(comp_sample, 'CompCited_Sample_v1.csv')
-nrow = len(comp_sample_cited)
-comp_sample_cited = clean_data(comp_sample_cited, 'Comparator', cited=True, source_df=comp_sample)
-comp_sample_cited.to_csv('CompCited_Sample_Final.csv', index=False)
-print('Cleaned comparator set cited-by {} written to CompCited_Sample_Final.csv.'.format(nrow / len(comp_sample_cited)))
+@pipeline.stage(deps=['pull_pubs'], code=CLEAN, files=MAPPING, outputs=['Pubs_Final.csv'])
+def clean_pubs(pulled):
+    pubs = pulled[0]
+    pubs_clean = clean_data(pubs, 'Interdisciplinary')
+    pubs_clean['query'] = pubs_clean.apply(lambda row: format_query(row), axis=1)
+    write_records(pubs_clean, 'Pubs_Final.csv')
+    print('Cleaned interdisciplinary set {} written to Pubs_Final.csv.'.format(len(pubs_clean) / len(pubs)))
+    return pubs_clean
+
+@pipeline.stage(deps=['clean_pubs'], code=[functions, planner], outputs=['Comp_v1.csv'])
+def pull_comparator(pubs_clean):
+    return pull_comp(pubs_clean, 'Comp_v1.csv')
+
+@pipeline.stage(deps=['clean_pubs'], code=[functions], outputs=['PubsCited_v1.csv'])
+def pull_pubs_cited(pubs_clean):
+    return pull_cited(pubs_clean, 'PubsCited_v1.csv')
+
+@pipeline.stage(deps=['pull_pubs_cited', 'clean_pubs'], code=CLEAN, files=MAPPING, outputs=['PubsCited_Final.csv'])
+def clean_pubs_cited(pubs_cited, pubs_clean):
+    nrow = len(pubs_cited)
+    pubs_cited = clean_data(pubs_cited, 'Interdisciplinary', cited=True, source_df=pubs_clean)
+    write_records(pubs_cited, 'PubsCited_Final.csv')
+    print('Cleaned interdisciplinary set cited-by {} written to PubsCited_Final.csv.'.format(nrow / len(pubs_cited)))
+    return pubs_cited
+
+'''
+Clean comparator set after removing interdisciplinary articles, then remove
+NSF-funded articles and articles by all CNH2 authors.
+'''
+@pipeline.stage(deps=['pull_comparator', 'clean_pubs', 'pull_pubs'], code=CLEAN + [authors], files=MAPPING,
+                outputs=['Comp_Final.csv'])
+def filter_comp(comp, pubs_clean, pulled):
+    post_CNH = pulled[1]
+    comp = comp[~comp.eid.isin(pubs_clean.eid)]
+    nrow = len(comp)
+    comp = clean_data(comp, 'Comparator')
+    comp = comp[comp['fund_sponsor'] != 'National Science Foundation']
+    comp = comp.query("fund_acr != 'NSF' | fund_sponsor == 'National Sleep Foundation' | fund_sponsor == 'National Stroke Foundation'")
+    cnh_auths = AuthorIndex(pd.concat([pubs_clean, post_CNH]))
+    comp = comp[~cnh_auths.overlaps(comp['author_ids'])]
+    write_records(comp, 'Comp_Final.csv')
+    print('Cleaned comparator set {} written to Comp_Final.csv.'.format(nrow / len(comp)))
+    return comp
+
+'''
+Sample 13% of every field/quartile group of the cleaned comparator set for
+the cited-by pull. The sample is drawn by a seeded hash of eid in one pass
+over Comp_Final.csv (see sampling.py), and the check of its group ratios
+against the full set is written to CompSample_Check.csv.
+Note: The sample of the paper was drawn without a seed and cannot be drawn
+again; set COMP_SAMPLE = DATA / 'CompSample.csv' to use that list instead.
+'''
+COMP_SAMPLE = None
+
+@pipeline.stage(deps=['filter_comp'], code=[functions, sampling], files=[COMP_SAMPLE] if COMP_SAMPLE else [],
+                outputs=['CompSample_Final.csv', 'CompSample_Check.csv'])
+def sample_comp(comp):
+    sampler = StratifiedSampler(frac=0.13, seed=42)
+    for chunk in iter_records('Comp_Final.csv'):
+        sampler.add(chunk)
+    comp_sample = sampler.sample() if COMP_SAMPLE is None else pd.read_csv(str(COMP_SAMPLE))
+    check = sampler.check(comp_sample)
+    check.to_csv('CompSample_Check.csv')
+    write_records(comp_sample, 'CompSample_Final.csv')
+    print('Sampled {} of {} comparator articles, largest group share difference {:.4f}, written to CompSample_Final.csv.'.format(
+        len(comp_sample), sampler.rows, check['difference'].abs().max()))
+    return comp_sample
+
+'''
+Pull cited-by articles of the comparator sample. Clean cited-by set.
+'''
+@pipeline.stage(deps=['sample_comp'], code=[functions], outputs=['CompCited_Sample_v1.csv'])
+def pull_comp_cited(comp_sample):
+    return pull_cited(comp_sample, 'CompCited_Sample_v1.csv')
+
+@pipeline.stage(deps=['pull_comp_cited', 'sample_comp'], code=CLEAN, files=MAPPING, outputs=['CompCited_Sample_Final.csv'])
+def clean_comp_cited(comp_sample_cited, comp_sample):
+    nrow = len(comp_sample_cited)
+    comp_sample_cited = clean_data(comp_sample_cited, 'Comparator', cited=True, source_df=comp_sample)
+    write_records(comp_sample_cited, 'CompCited_Sample_Final.csv')
+    print('Cleaned comparator set cited-by {} written to CompCited_Sample_Final.csv.'.format(nrow / len(comp_sample_cited)))
+    return comp_sample_cited
+
+'''
+Issue-level citation z-scores (std) over the cleaned interdisciplinary and
+comparator sets, as normalized in Data_Analysis_v1.ipynb. Keep running
+statistics to update the z-scores as new or refreshed records come in.
+'''
+@pipeline.stage(deps=['clean_pubs', 'filter_comp'], code=[functions, zscore], outputs=['IssueStats.csv', 'Normed_Final.csv'])
+def normalize(pubs_clean, comp):
+    issue_stats = IssueStats().upsert(pd.concat([pubs_clean, comp]))
+    issue_stats.save('IssueStats.csv')
+    normed = issue_stats.transform(pd.concat([pubs_clean, comp]))
+    write_records(normed, 'Normed_Final.csv')
+    print('Normalized {} articles over {} journal issues, written to Normed_Final.csv.'.format(len(normed), len(issue_stats.stats)))
+    return normed
+
+
+if __name__ == '__main__':
+    METRICS.open('metrics.jsonl')
+    results = pipeline.run()
+    METRICS.write_prometheus('metrics.prom')
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+'''
+Date: Sun Oct 18, 2026
+Purpose: This script builds and loads our journal Quartile, Field, and
+    CiteScore mapping.
+    From Scopus source list (https://www.scopus.com/sources), we get the
+    Scopus within-field journal quartiles. We map the ASJC Code to EC, GI, NS,
+    or Other using a predetermined mapping and choose field by heuristic
+    described in the paper. Some "Multidisciplinary" journals covering natural
+    science fields, such as "PLoS One", are also mapped to NS. Quartiles
+    remain correct.
+    build_journal_mapping() writes journalmapping.csv from the source list.
+    load_journals() reads journalmapping.csv once into a pickled artifact
+    (mapping table plus resolution index) that is reused until the csv or
+    the code building it changes.
+Execution: python mapping.py CiteScore_Metrics_2011-2018_Download_Nov2019.csv
+'''
+
+import pandas as pd, hashlib, inspect, pickle, sys
+from pathlib import Path
+from journal_index import JournalIndex
+
+
+DATA = Path('../Data')
+
+# "Multidisciplinary" journals covering natural science fields
+NS_JOURNALS = [
+    "anais da academia brasileira de ciencias",
+    "archives des sciences",
+    "asm science journal",
+    "beijing daxue xuebao (ziran kexue ban)/acta scientiarum naturalium universitatis pekinensis",
+    "brazilian archives of biology and technology",
+    "bulletin de la societe royale des sciences de liege",
+    "bulletin de la societe vaudoise des sciences naturelles",
+    "bulletin of the georgian national academy of sciences",
+    "chiang mai university journal of natural sciences",
+    "ciencia and engenharia/ science and engineering journal",
+    "comptes rendus de l'academie bulgare des sciences",
+    "current science",
+    "heliyon",
+    "hunan daxue xuebao/journal of hunan university natural sciences",
+    "interciencia",
+    "jilin daxue xuebao (gongxueban)/journal of jilin university (engineering and technology edition)",
+    "journal and proceedings - royal society of new south wales",
+    "journal of advanced research",
+    "journal of king saud university - science",
+    "journal of sciences, islamic republic of iran",
+    "journal of scientific and industrial research",
+    "journal of shanghai jiaotong university (science)",
+    "journal of the indian institute of science",
+    "journal of the national science foundation of sri lanka",
+    "journal of the royal society of new zealand",
+    "journal of zhejiang university, science edition",
+    "kexue tongbao, scientia",
+    "kuwait journal of science",
+    "liaoning gongcheng jishu daxue xuebao (ziran kexue ban)/journal of liaoning technical university (natural science edition)",
+    "maejo international journal of science and technology",
+    "malaysian journal of science",
+    "national science review",
+    "new scientist",
+    "ohio journal of sciences",
+    "pacific science",
+    "papers and proceedings - royal society of tasmania",
+    "philippine journal of science",
+    "plos one",
+    "proceedings of the latvian academy of sciences, section b: natural, exact, and applied sciences",
+    "revista lasallista de investigacion",
+    "royal society open science",
+    "sadhana - academy proceedings in engineering sciences",
+    "sains malaysiana",
+    "science advances",
+    "science bulletin",
+    "science progress",
+    "science, technology and society",
+    "scienceasia",
+    "scientific american",
+    "scientific journal of king faisal university",
+    "scientific reports",
+    "shanghai jiaotong daxue xuebao/journal of shanghai jiaotong university",
+    "shenyang jianzhu daxue xuebao (ziran kexue ban)/journal of shenyang jianzhu university (natural science)",
+    "songklanakarin journal of science and technology",
+    "tianjin daxue xuebao (ziran kexue yu gongcheng jishu ban)/journal of tianjin university science and technology",
+    "tongji daxue xuebao/journal of tongji university",
+    "transactions of tianjin university",
+    "tsinghua science and technology",
+    "universitas scientiarum",
+    "walailak journal of science and technology",
+    "world review of science, technology and sustainable development",
+    "wuhan university journal of natural sciences",
+    "xi'an shiyou daxue xuebao (ziran kexue ban)/journal of xi'an shiyou university, natural sciences edition",
+    "xinan jiaotong daxue xuebao/journal of southwest jiaotong university",
+    "zhongshan daxue xuebao/acta scientiarum natralium universitatis sunyatseni"
+]
+
+# General interest journals
+GI_JOURNALS = ['nature', 'science',
+               'proceedings of the national academy of sciences of the united states of america']
+
+
+def build_journal_mapping(citescore_file, fieldmapping_file=DATA / 'fieldmapping.csv',
+                          output_file=DATA / 'journalmapping.csv'):
+    '''
+    Build journalmapping.csv from the Scopus CiteScore source list download.
+    A journal listed under several subject areas keeps its EC entry if all
+    entries share one quartile, and its first entry otherwise.
+    '''
+
+    d = pd.read_csv(str(fieldmapping_file), index_col='ASJC_Code',
+                    usecols=['ASJC_Code', 'Mapping']).to_dict()['Mapping']
+    scj = pd.read_csv(str(citescore_file), encoding='cp1252', dtype=str)
+    scj = scj.fillna('')
+    scj['Field'] = (scj['Scopus ASJC Code (Sub-subject Area)'].str[:2] + '**').map(d)
+    scj.loc[scj.Title.str.lower().isin(NS_JOURNALS), 'Field'] = 'NS'
+
+    rows = {}
+    for row in scj.itertuples():
+        rows.setdefault(getattr(row, 'Title').lower(), []).append(
+            (getattr(row, 'Quartile'), getattr(row, 'Field'), getattr(row, 'CiteScore')))
+
+    mapping = {}
+    for key, val in rows.items():
+        f = [pair[1] for pair in val]
+        if len(set([pair[0] for pair in val])) == 1 and 'EC' in f: # i.e. all same quartile
+            mapping[key] = list(val[f.index('EC')])
+        else:
+            mapping[key] = list(val[0])
+    for key in GI_JOURNALS:
+        if key in mapping:
+            mapping[key][1] = 'GI'
+
+    mappingdf = pd.DataFrame.from_dict(mapping, orient='index', columns=['Quartile', 'Field', 'CiteScore'])
+    mappingdf.to_csv(str(output_file), index_label='Publication_Name')
+    return mappingdf
+
+def _digest(*files):
+    h = hashlib.sha1()
+    for file in files:
+        with open(str(file), 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+def build_journals(mapping_file=DATA / 'journalmapping.csv'):
+    '''
+    Mapping table indexed by lower-cased Publication_Name, with categorical
+    Field and Quartile, and its JournalIndex.
+    '''
+
+    mappingdf = pd.read_csv(str(mapping_file))
+    journals = mappingdf.drop_duplicates('Publication_Name', keep='last').set_index('Publication_Name')
+    journals = journals.astype({'Field': pd.CategoricalDtype(sorted(mappingdf.Field.dropna().unique())),
+                                'Quartile': pd.CategoricalDtype(sorted(mappingdf.Quartile.dropna().unique()))})
+    return journals, JournalIndex(journals.reset_index())
+
+def load_journals(mapping_file=DATA / 'journalmapping.csv', artifact=None):
+    '''
+    Load build_journals() output from its pickled artifact, rebuilding the
+    artifact when mapping_file or the code building it (this file and
+    journal_index.py) has changed.
+    '''
+
+    artifact = Path(artifact or Path(mapping_file).with_suffix('.pkl'))
+    digest = _digest(mapping_file, inspect.getsourcefile(JournalIndex), __file__)
+    try:
+        with open(str(artifact), 'rb') as f:
+            saved = pickle.load(f)
+        if saved['digest'] == digest:
+            return saved['journals'], saved['index']
+    except (OSError, EOFError, KeyError, ImportError, AttributeError, pickle.UnpicklingError):
+        pass
+    journals, index = build_journals(mapping_file)
+    with open(str(artifact), 'wb') as f:
+        pickle.dump({'digest': digest, 'journals': journals, 'index': index}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return journals, index
+
+
+if __name__ == '__main__':
+    build_journal_mapping(sys.argv[1])
+    load_journals()
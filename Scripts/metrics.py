@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+'''
+Date: Sun Oct 18, 2026
+Purpose: This script records where time and API quota go during pulls.
+    Counters and histograms are kept per label set (stage, query type,
+    status, ...) and can be written as a Prometheus text snapshot; with a log
+    file open, every API request, finished search and finished stage is also
+    appended to it as one JSON line. functions.py and client.py record into
+    the shared METRICS instance.
+Execution: METRICS.open('metrics.jsonl') before pulling, then
+    METRICS.write_prometheus('metrics.prom').
+'''
+
+import bisect, contextvars, functools, json, threading, time
+from contextlib import contextmanager
+
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+COUNT_BUCKETS = [0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000]
+
+
+def query_type(query):
+    '''
+    Search field a query starts with, e.g. 'REFEID' or 'TITLE', with '_OR'
+    for batched queries.
+    '''
+
+    field = query.lstrip('( ').split('(', 1)[0].strip().upper() or 'OTHER'
+    return field + '_OR' if ' OR ' in query else field
+
+_STAGE = contextvars.ContextVar('stage', default='none')
+
+def _labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Metrics:
+    '''
+    Thread-safe counters and histograms. Metrics recorded inside a stage()
+    block get its stage label. The stage is kept per context, so stages
+    running in parallel threads (and ScopusClient.map workers started by
+    them) are labelled separately.
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.log = None
+
+    @property
+    def current_stage(self):
+        return _STAGE.get()
+
+    def open(self, path):
+        '''
+        Append JSON line events to path.
+        '''
+
+        self.close()
+        self.log = open(path, 'a', encoding='utf8')
+
+    def close(self):
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+
+    def reset(self):
+        with self.lock:
+            self.counters, self.histograms = {}, {}
+
+    def event(self, kind, **fields):
+        '''
+        Write one JSON line event, if a log is open.
+        '''
+
+        if self.log is None:
+            return
+        line = json.dumps(dict({'time': time.time(), 'event': kind, 'stage': self.current_stage}, **fields), default=str)
+        with self.lock:
+            self.log.write(line + '\n')
+            self.log.flush()
+
+    def inc(self, name, value=1, **labels):
+        labels.setdefault('stage', self.current_stage)
+        key = (name, _labels(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        labels.setdefault('stage', self.current_stage)
+        key = (name, _labels(labels))
+        with self.lock:
+            h = self.histograms.get(key)
+            if h is None:
+                h = self.histograms[key] = {'buckets': buckets, 'counts': [0] * (len(buckets) + 1), 'sum': 0.0, 'count': 0}
+            h['counts'][bisect.bisect_left(h['buckets'], value)] += 1
+            h['sum'] += value
+            h['count'] += 1
+
+    @contextmanager
+    def stage(self, name):
+        '''
+        Label metrics recorded inside the block with stage name, and log the
+        stage's duration, quota used, records and errors when it ends.
+        '''
+
+        totals = ('scopus_quota_used_total', 'pull_records_total', 'pull_errors_total')
+        before = [self.value(t, stage=name) for t in totals]
+        token = _STAGE.set(name)
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            elapsed = time.perf_counter() - start
+            self.inc('stage_seconds_total', elapsed)
+            quota, records, errors = (self.value(t, stage=name) - b for t, b in zip(totals, before))
+            self.event('stage', seconds=elapsed, quota_used=quota, records=records, errors=errors)
+            _STAGE.reset(token)
+
+    def staged(self, name):
+        '''
+        Decorator running a function inside stage(name).
+        '''
+
+        def wrap(fn):
+            @functools.wraps(fn)
+            def run(*args, **kwargs):
+                with self.stage(name):
+                    return fn(*args, **kwargs)
+            return run
+        return wrap
+
+    def value(self, name, **labels):
+        '''
+        Sum of a counter over all label sets matching labels.
+        '''
+
+        want = set(_labels(labels))
+        with self.lock:
+            return sum(v for (n, l), v in self.counters.items() if n == name and want <= set(l))
+
+    def to_prometheus(self):
+        '''
+        Prometheus text exposition of all metrics.
+        '''
+
+        def fmt(labels, extra=()):
+            labels = list(labels) + list(extra)
+            return '{' + ','.join('{}="{}"'.format(k, v.replace('"', '\\"')) for k, v in labels) + '}' if labels else ''
+
+        lines = []
+        with self.lock:
+            for name in sorted({n for n, _ in self.counters}):
+                lines.append('# TYPE {} counter'.format(name))
+                for (n, labels), v in sorted(self.counters.items()):
+                    if n == name:
+                        lines.append('{}{} {}'.format(name, fmt(labels), v))
+            for name in sorted({n for n, _ in self.histograms}):
+                lines.append('# TYPE {} histogram'.format(name))
+                for (n, labels), h in sorted(self.histograms.items(), key=lambda kv: kv[0]):
+                    if n != name:
+                        continue
+                    total = 0
+                    for bound, count in zip(h['buckets'] + ['+Inf'], h['counts']):
+                        total += count
+                        lines.append('{}_bucket{} {}'.format(name, fmt(labels, [('le', str(bound))]), total))
+                    lines.append('{}_sum{} {}'.format(name, fmt(labels), h['sum']))
+                    lines.append('{}_count{} {}'.format(name, fmt(labels), h['count']))
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        with open(path, 'w', encoding='utf8') as f:
+            f.write(self.to_prometheus())
+
+
+METRICS = Metrics()
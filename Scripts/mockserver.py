@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+'''
+Date: Sun Oct 18, 2026
+Purpose: This script provides a local stand-in for the Scopus Search API so
+    the pull pipeline can be run and benchmarked without spending quota. It
+    serves COMPLETE-view JSON pages rebuilt from pulled records (by default
+    Data/Pubs_CNH_Post-2011.csv) for the queries the pipeline sends (TITLE,
+    SRCTITLE, EXACTSRCTITLE/VOLUME/ISSUE, DOI, EID, ALL and REFEID joined by
+    AND/OR, with parenthesized OR groups and LOAD-DATE AFT/BEF/IS
+    restrictions; an entry's load date is its cover date), with cursor
+    paging, per-key X-RateLimit-* headers and quota, and optional latency
+    and injected 429/500 errors. Issue queries are padded with generated
+    articles from the same issue, and cited-by (REFEID) queries return a
+    fixed pseudo-random set of records per EID.
+Execution: with MockScopus() as server:
+               functions.CLIENT = ScopusClient(url=server.url, rate=1000)
+'''
+
+import numpy as np, pandas as pd, ast, json, random, re, threading, time, zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from functions import _fold
+from mapping import DATA
+
+
+PAGE_SIZE = 25 # COMPLETE view returns at most 25 entries per page
+TERM = re.compile(r'^([A-Z-]+)\((.*)\)$', re.S)
+DATE_TERM = re.compile(r'^(LOAD-DATE|ORIG-LOAD-DATE) (AFT|BEF|IS) (\d{8})$')
+EMPTY = [{'@_fa': 'true', 'error': 'Result set was empty'}]
+
+
+# =============================================================================
+# Synthetic Scopus entries from pulled records
+# =============================================================================
+
+def _entry(row):
+    '''
+    Rebuild a COMPLETE-view search entry from a pulled record.
+    '''
+
+    keys = {'eid': 'eid', 'title': 'dc:title', 'publication_name': 'prism:publicationName',
+            'issn': 'prism:issn', 'isbn': 'prism:isbn', 'eissn': 'prism:eIssn',
+            'volume': 'prism:volume', 'issue': 'prism:issueIdentifier',
+            'page_range': 'prism:pageRange', 'cover_date': 'prism:coverDate',
+            'doi': 'prism:doi', 'description': 'dc:description',
+            'aggregation_type': 'prism:aggregationType',
+            'subtype_description': 'subtypeDescription', 'auth_keywords': 'authkeywords',
+            'fund_acr': 'fund-acr', 'fund_no': 'fund-no', 'fund_sponsor': 'fund-sponsor'}
+    entry = {key: row[col] for col, key in keys.items() if not pd.isna(row[col])}
+    entry['dc:identifier'] = 'SCOPUS_ID:' + str(row['scopus_id'])
+    if not pd.isna(row['citation_count']):
+        entry['citedby-count'] = str(int(row['citation_count']))
+    if not pd.isna(row['author_ids']):
+        entry['author'] = [{'authid': i, 'authname': n} for i, n in
+                           zip(ast.literal_eval(row['author_ids']), ast.literal_eval(row['author_name_list']))]
+    entry['link'] = [{'@ref': 'self', '@href': 'https://api.elsevier.com/content/abstract/scopus_id/' + str(row['scopus_id'])}]
+    if not pd.isna(row['full_text']):
+        entry['link'].append({'@ref': 'full-text', '@href': row['full_text']})
+    return entry
+
+def load_records(file='Pubs_CNH_Post-2011.csv'):
+    return pd.read_csv(str(DATA / file), dtype={'scopus_id': str, 'issn': str, 'eissn': str,
+                                                'volume': str, 'issue': str})
+
+def load_entries(file='Pubs_CNH_Post-2011.csv'):
+    return [_entry(row) for _, row in load_records(file).iterrows()]
+
+
+# =============================================================================
+# Query evaluation
+# =============================================================================
+
+def _split(query, sep):
+    '''
+    Split query on sep outside parentheses and quotes.
+    '''
+
+    parts, depth, quoted, start, i = [], 0, False, 0, 0
+    while i < len(query):
+        c = query[i]
+        if c == '"':
+            quoted = not quoted
+        elif not quoted and c == '(':
+            depth += 1
+        elif not quoted and c == ')':
+            depth -= 1
+        elif not quoted and depth == 0 and query.startswith(sep, i):
+            parts.append(query[start:i].strip())
+            i += len(sep)
+            start = i
+            continue
+        i += 1
+    parts.append(query[start:].strip())
+    return parts
+
+def _seed(s):
+    return zlib.crc32(s.encode('utf8'))
+
+
+class MockScopus:
+    '''
+    Threaded HTTP server answering Scopus Search API requests from a table of
+    pulled records. quota is per API key; error_rate and throttle_rate are
+    the shares of requests answered with a 500 or a retryable 429; latency
+    is seconds per request; issue_size caps the generated articles per
+    journal issue and cited_by caps the citing records per REFEID query.
+    '''
+
+    def __init__(self, records=None, quota=20000, latency=0.0, error_rate=0.0, throttle_rate=0.0,
+                 issue_size=40, cited_by=60, seed=0, host='127.0.0.1', port=0):
+        records = load_records() if records is None else records.reset_index(drop=True)
+        self.entries = [_entry(row) for _, row in records.iterrows()]
+        self.title = records['title'].map(_fold).to_numpy()
+        self.journal = records['publication_name'].map(_fold).to_numpy()
+        self.exact = records['publication_name'].str.lower().str.strip().to_numpy()
+        self.volume = records['volume'].fillna('').astype(str).to_numpy()
+        self.issue = records['issue'].fillna('').astype(str).to_numpy()
+        self.doi = records['doi'].fillna('').str.lower().to_numpy()
+        self.eid = records['eid'].astype(str).to_numpy()
+        self.quota, self.latency = quota, latency
+        self.error_rate, self.throttle_rate = error_rate, throttle_rate
+        self.issue_size, self.cited_by = issue_size, cited_by
+        self.random = random.Random(seed)
+        self.remaining = {}
+        self.stats = {'requests': 0, 'pages': 0, 'entries': 0, 'status': {}}
+        self.results = {}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return 'http://{}:{}/content/search/scopus'.format(host, port)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {'requests': 0, 'pages': 0, 'entries': 0, 'status': {}}
+
+    def _term(self, field, value):
+        '''
+        Mask of records matching one field(value) term.
+        '''
+
+        value = value.strip().strip('"').strip()
+        if field == 'TITLE':
+            return np.array([_fold(value) in t for t in self.title])
+        if field == 'SRCTITLE':
+            return np.array([_fold(value) in j for j in self.journal])
+        if field == 'EXACTSRCTITLE':
+            return self.exact == ' '.join(value.lower().split())
+        if field == 'VOLUME':
+            return self.volume == value
+        if field == 'ISSUE':
+            return self.issue == value
+        if field == 'DOI':
+            return self.doi == value.lower()
+        if field == 'EID':
+            return self.eid == value
+        if field == 'ALL':
+            text = _fold(value)
+            return np.array([bool(t) and t in text for t in self.title])
+        raise ValueError('Unsupported field ' + field)
+
+    def _siblings(self, template, key, n):
+        '''
+        n generated articles from the issue of template, with stable EIDs.
+        '''
+
+        entries = []
+        for k in range(n):
+            entry = dict(template)
+            number = 90000000000 + (_seed(key) % 10 ** 6) * 1000 + k
+            entry['eid'], entry['dc:identifier'] = '2-s2.0-%d' % number, 'SCOPUS_ID:%d' % number
+            entry['dc:title'] = '{} {}'.format(template.get('dc:title', ''), k)
+            entry['citedby-count'] = str(_seed(key + str(k)) % 200)
+            entry.pop('prism:doi', None)
+            entries.append(entry)
+        return entries
+
+    def _cited_by(self, eid):
+        '''
+        A fixed pseudo-random set of records citing eid.
+        '''
+
+        rng = np.random.default_rng(_seed(eid))
+        n = int(rng.integers(0, self.cited_by + 1))
+        return [self.entries[i] for i in rng.choice(len(self.entries), min(n, len(self.entries)), replace=False)]
+
+    def _load_date(self, entry):
+        return entry.get('prism:coverDate', '').replace('-', '')
+
+    def _conjunction(self, part):
+        '''
+        Entries matching terms joined by AND.
+        '''
+
+        terms, groups, dates = [], [], []
+        for term in _split(part, ' AND '):
+            if term.startswith('(') and term.endswith(')'):
+                term = term[1:-1].strip()
+                if len(_split(term, ' OR ')) > 1 or len(_split(term, ' AND ')) > 1:
+                    groups.append(self._disjunction(term))
+                    continue
+            m = DATE_TERM.match(term)
+            if m is not None:
+                dates.append(m.groups()[1:])
+                continue
+            m = TERM.match(term)
+            if m is None:
+                raise ValueError('Cannot parse ' + term)
+            terms.append(m.groups())
+        if not terms:
+            entries = groups.pop(0) if groups else []
+        elif terms[0][0] == 'REFEID':
+            entries = self._cited_by(terms[0][1].strip())
+        else:
+            mask = np.ones(len(self.entries), dtype=bool)
+            for field, value in terms:
+                mask &= self._term(field, value)
+            entries = [self.entries[i] for i in np.flatnonzero(mask)]
+            if terms[0][0] == 'EXACTSRCTITLE' and entries:
+                entries = entries + self._siblings(entries[0], part.lower(), _seed(part.lower()) % (self.issue_size + 1))
+        for group in groups:
+            eids = {entry['eid'] for entry in group}
+            entries = [entry for entry in entries if entry['eid'] in eids]
+        for op, day in dates:
+            keep = {'AFT': lambda d: d > day, 'BEF': lambda d: d < day, 'IS': lambda d: d == day}[op]
+            entries = [entry for entry in entries if keep(self._load_date(entry))]
+        return entries
+
+    def _disjunction(self, query):
+        found, seen = [], set()
+        for part in _split(query, ' OR '):
+            for entry in self._conjunction(part):
+                if entry['eid'] not in seen:
+                    seen.add(entry['eid'])
+                    found.append(entry)
+        return found
+
+    def evaluate(self, query):
+        '''
+        All entries matching query, in record order. Results are kept per
+        query so that pages of one search are consistent.
+        '''
+
+        with self.lock:
+            if query in self.results:
+                return self.results[query]
+        found = self._disjunction(' '.join(query.split()))
+        with self.lock:
+            self.results[query] = found
+        return found
+
+    def respond(self, params):
+        '''
+        (status, headers, body) for a request's query parameters.
+        '''
+
+        key = params.get('apikey', [''])[0]
+        with self.lock:
+            self.stats['requests'] += 1
+            remaining = self.remaining.get(key, self.quota)
+            roll = self.random.random()
+        headers = {'X-RateLimit-Limit': str(self.quota), 'X-RateLimit-Reset': str(int(time.time()) + 7 * 24 * 3600)}
+        if remaining <= 0:
+            headers['X-RateLimit-Remaining'] = '0'
+            return 429, headers, {'error-response': {'error-code': 'TOO_MANY_REQUESTS', 'error-message': 'Quota Exceeded'}}
+        if roll < self.error_rate:
+            return 500, headers, {'service-error': {'status': {'statusCode': 'GENERAL_SYSTEM_ERROR', 'statusText': 'Injected error'}}}
+        if roll < self.error_rate + self.throttle_rate:
+            headers['X-RateLimit-Remaining'], headers['Retry-After'] = str(remaining), '0'
+            return 429, headers, {'error-response': {'error-code': 'TOO_MANY_REQUESTS', 'error-message': 'Rate limit exceeded'}}
+
+        with self.lock:
+            self.remaining[key] = remaining - 1
+        headers['X-RateLimit-Remaining'] = str(remaining - 1)
+        query, cursor = params.get('query', [''])[0], params.get('cursor', ['*'])[0]
+        try:
+            found = self.evaluate(query)
+        except ValueError as e:
+            return 400, headers, {'service-error': {'status': {'statusCode': 'INVALID_INPUT', 'statusText': str(e)}}}
+        start = 0 if cursor == '*' else int(cursor)
+        page = found[start:start + PAGE_SIZE]
+        with self.lock:
+            self.stats['pages'] += 1
+            self.stats['entries'] += len(page)
+        return 200, headers, {'search-results': {
+            'opensearch:totalResults': str(len(found)),
+            'opensearch:startIndex': str(start),
+            'opensearch:itemsPerPage': str(len(page)),
+            'cursor': {'@current': cursor, '@next': str(start + len(page))},
+            'entry': page or EMPTY}}
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                if mock.latency:
+                    time.sleep(mock.latency)
+                status, headers, body = mock.respond(parse_qs(urlparse(self.path).query))
+                with mock.lock:
+                    mock.stats['status'][status] = mock.stats['status'].get(status, 0) + 1
+                data = json.dumps(body).encode('utf8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
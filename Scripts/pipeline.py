@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+'''
+Date: Sun Oct 18, 2026
+Purpose: This script runs the data collection steps of main.py as a graph of
+    stages. Each stage is a function of the results of the stages it depends
+    on. Its result is pickled under a key hashing its code, the modules it
+    declares as its code dependencies, the contents of the input files it
+    reads and the keys of its dependencies, so a stage only reruns when one
+    of those changed or one of its output files is missing. Stages whose dependencies are done run in
+    parallel threads, e.g. the comparator and cited-by pulls, which share the
+    client's rate limit and API keys.
+Execution: pipeline.run() or pipeline.run(['clean_cited']), see main.py
+'''
+
+import pandas as pd, hashlib, inspect, os, time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from metrics import METRICS
+
+
+def _file_hash(path, h, block=2 ** 20):
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(block), b''):
+            h.update(chunk)
+
+
+class Stage:
+    '''
+    One step of a Pipeline: fn is called with the results of deps, in order.
+    code is the modules fn relies on, files are input files it reads and
+    outputs files it writes.
+    '''
+
+    def __init__(self, name, fn, deps=(), code=(), files=(), outputs=()):
+        self.name, self.fn = name, fn
+        self.deps, self.code = list(deps), list(code)
+        self.files, self.outputs = list(files), list(outputs)
+
+
+class Pipeline:
+    '''
+    Graph of stages with results kept under root.
+    '''
+
+    def __init__(self, root='pipeline'):
+        self.root = root
+        self.stages = {}
+        self.results = {}
+        self._keys = {}
+
+    def stage(self, name=None, deps=(), code=(), files=(), outputs=()):
+        '''
+        Decorator adding a function as a stage, named after the function by
+        default. code is the modules whose source is part of the stage's
+        key, e.g. code=[zscore].
+        '''
+
+        def add(fn):
+            stage_name = name or fn.__name__
+            missing = [d for d in deps if d not in self.stages]
+            if missing:
+                raise ValueError('Stage {} depends on unknown stages {}'.format(stage_name, missing))
+            self.stages[stage_name] = Stage(stage_name, fn, deps, code, files, outputs)
+            return fn
+        return add
+
+    def key(self, name):
+        '''
+        Hash of a stage's code, its code modules, input files and
+        dependencies.
+        '''
+
+        if name not in self._keys:
+            stage = self.stages[name]
+            h = hashlib.sha256(name.encode('utf8'))
+            h.update(inspect.getsource(stage.fn).encode('utf8'))
+            for module in stage.code:
+                _file_hash(inspect.getsourcefile(module), h)
+            for file in stage.files:
+                h.update(str(file).encode('utf8'))
+                _file_hash(file, h)
+            for dep in stage.deps:
+                h.update(self.key(dep).encode('utf8'))
+            self._keys[name] = h.hexdigest()[:16]
+        return self._keys[name]
+
+    def _artifact(self, name):
+        return os.path.join(self.root, '{}-{}.pkl'.format(name, self.key(name)))
+
+    def is_current(self, name):
+        return os.path.exists(self._artifact(name)) and all(os.path.exists(f) for f in self.stages[name].outputs)
+
+    def result(self, name):
+        '''
+        Result of a stage that is current, loaded once.
+        '''
+
+        if name not in self.results:
+            self.results[name] = pd.read_pickle(self._artifact(name))
+        return self.results[name]
+
+    def _needed(self, targets):
+        needed, todo = set(), list(targets)
+        while todo:
+            name = todo.pop()
+            if name not in needed:
+                needed.add(name)
+                todo.extend(self.stages[name].deps)
+        return needed
+
+    def _execute(self, name):
+        stage = self.stages[name]
+        start = time.perf_counter()
+        with METRICS.stage(name):
+            result = stage.fn(*[self.result(d) for d in stage.deps])
+        os.makedirs(self.root, exist_ok=True)
+        for old in os.listdir(self.root):
+            if old.startswith(name + '-') and old.endswith('.pkl') and old[len(name) + 1:-4] != self.key(name):
+                os.remove(os.path.join(self.root, old))
+        pd.to_pickle(result, self._artifact(name))
+        self.results[name] = result
+        print('Stage {} done in {:.1f} s.'.format(name, time.perf_counter() - start))
+        return result
+
+    def run(self, targets=None, force=(), workers=4):
+        '''
+        Bring targets (by default every stage) up to date, rerunning stages in
+        force and everything depending on them. Stages run once their
+        dependencies are done, up to workers at a time. Returns the results
+        of targets by name.
+        '''
+
+        targets = list(targets or self.stages)
+        needed = self._needed(targets)
+        self._keys = {}
+        stale = set()
+        for name in self.stages:
+            if name in needed and (name in force or not self.is_current(name) or stale & set(self.stages[name].deps)):
+                stale.add(name)
+        print('{} of {} stages to run: {}'.format(len(stale), len(needed), ', '.join(n for n in self.stages if n in stale)))
+
+        done = needed - stale
+        running = {}
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while len(done) < len(needed):
+                for name in self.stages:
+                    if name in stale and name not in running and set(self.stages[name].deps) <= done:
+                        running[name] = pool.submit(self._execute, name)
+                        print('Stage {} started.'.format(name))
+                finished, _ = wait(running.values(), return_when=FIRST_COMPLETED)
+                for name, future in list(running.items()):
+                    if future in finished:
+                        future.result()
+                        stale.discard(name)
+                        done.add(name)
+                        del running[name]
+        return {name: self.result(name) for name in targets}
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+'''
+Date: Sun Oct 18, 2026
+Purpose: This script plans the comparator set queries built by format_query
+    before pull_comp runs them. Queries are normalized and deduplicated, and a
+    query is dropped when another planned query subsumes it, i.e. the same
+    journal with a subset of its VOLUME/ISSUE restrictions. Each planned query
+    is run once and its records are fanned back out to every originating
+    query by filtering on volume and issue locally.
+'''
+
+import pandas as pd, re
+from collections import OrderedDict
+
+
+QUERY = re.compile(r'^EXACTSRCTITLE\((.+?)\)(?: AND VOLUME\((.+?)\))?(?: AND ISSUE\((.+?)\))?$')
+
+
+def parse_query(query):
+    '''
+    Split a format_query string into normalized (journal, volume, issue);
+    volume and issue are None when not restricted. Returns None for other
+    queries.
+    '''
+
+    m = QUERY.match(' '.join(query.split()))
+    if m is None:
+        return None
+    journal, volume, issue = m.groups()
+    journal = ' '.join(journal.strip().strip('"').lower().split())
+    return journal, volume and volume.strip(), issue and issue.strip()
+
+def subsumes(a, b):
+    '''
+    Whether parsed query a returns every record of parsed query b.
+    '''
+
+    return a[0] == b[0] and all(x is None or x == y for x, y in zip(a[1:], b[1:]))
+
+def _value(v):
+    return None if v is None or pd.isna(v) else str(v).strip()
+
+
+class QueryPlan:
+    '''
+    Plan for a list of queries. runs are the queries to send, in first-seen
+    order, and targets maps each run to the distinct originating queries it
+    answers.
+    '''
+
+    def __init__(self, queries):
+        self.queries = list(queries)
+        self.parsed = {}
+        unique = OrderedDict()
+        for q in self.queries:
+            p = parse_query(q)
+            key = p if p is not None else ' '.join(q.lower().split())
+            unique.setdefault(key, q)
+            self.parsed[q] = p
+
+        # Journal-level groups, least restricted queries first
+        by_journal = {}
+        for key, q in unique.items():
+            if isinstance(key, tuple):
+                by_journal.setdefault(key[0], []).append(key)
+        self.targets = OrderedDict()
+        self.run_of = {}
+        for key, q in unique.items():
+            run = q
+            if isinstance(key, tuple):
+                parents = [p for p in by_journal[key[0]] if p != key and subsumes(p, key)]
+                if parents:
+                    top = min(parents, key=lambda p: (p[1] is not None) + (p[2] is not None))
+                    run = unique[top]
+            self.targets.setdefault(run, [])
+            self.run_of[key] = run
+        for q in self.queries:
+            p = self.parsed[q]
+            key = p if p is not None else ' '.join(q.lower().split())
+            if q not in self.targets[self.run_of[key]]:
+                self.targets[self.run_of[key]].append(q)
+        self.runs = list(self.targets)
+
+    def report(self):
+        '''
+        Print the number of queries saved, before paging.
+        '''
+
+        n_unique = len(self.run_of)
+        print('Query plan: {} rows, {} distinct queries ({} duplicates), {} subsumed, {} to run. '
+              'Saves at least {} queries.'.format(len(self.queries), n_unique, len(self.queries) - n_unique,
+                                                  n_unique - len(self.runs), len(self.runs),
+                                                  len(self.queries) - len(self.runs)))
+
+    def fan_out(self, run, result_df):
+        '''
+        Yield (originating query, its records) for the records of a run.
+        '''
+
+        for q in self.targets[run]:
+            p = self.parsed[q]
+            if q == run or p is None or p == self.parsed[run]:
+                yield q, result_df
+                continue
+            mask = pd.Series(True, index=result_df.index)
+            if p[1] is not None:
+                mask &= result_df['volume'].map(_value) == p[1]
+            if p[2] is not None:
+                mask &= result_df['issue'].map(_value) == p[2]
+            yield q, result_df[mask]
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+'''
+Date: Sun Oct 18, 2026
+Purpose: This script updates pulled cited-by sets and citation counts
+    without pulling them again. The last time each EID's cited-by records
+    and citation count were fetched is kept in a fetch log. refresh_cited()
+    asks only for citing records loaded since then (REFEID(...) AND
+    LOAD-DATE AFT yyyymmdd). Many EIDs are checked in one OR query, and only
+    the batches with new records are split until each record is attributed
+    to its EID. New and updated records are merged into the cited-by file by
+    eid. refresh_counts() updates citation_count 25 records per
+    EID(...) OR ... query. A monthly refresh of a few thousand EIDs costs a
+    few hundred queries instead of a full pull.
+Execution: refresh_cited(pubs_clean, 'PubsCited_v1.csv')
+           pubs_clean = refresh_counts(pubs_clean)
+'''
+
+import pandas as pd, functions, os, re
+from datetime import datetime, timedelta
+from functions import search, read_records, write_records, _or_batches
+from journal import ProgressJournal
+from metrics import METRICS
+
+
+EMPTY = 'Result set was empty'
+MAX_AGE = 24 * 3600 # cached pages older than this are fetched again
+KINDS = ['cited_by', 'citation_count']
+
+
+class FetchLog:
+    '''
+    Last fetch time per EID and kind of refresh, kept in a csv file.
+    '''
+
+    def __init__(self, path='FetchLog.csv'):
+        self.path = path
+        if os.path.exists(path):
+            self.log = pd.read_csv(path, index_col='eid', dtype=str)
+        else:
+            self.log = pd.DataFrame(columns=KINDS, index=pd.Index([], name='eid'), dtype=object)
+
+    def last(self, eids, kind):
+        '''
+        Last fetch time of each EID, NaT if never.
+        '''
+
+        return pd.to_datetime(self.log[kind].reindex(eids))
+
+    def mark(self, eids, kind, when):
+        eids = pd.Index(eids).unique()
+        self.log = self.log.reindex(self.log.index.union(eids))
+        self.log.loc[eids, kind] = when.isoformat(timespec='seconds')
+        self.log.index.name = 'eid'
+
+    def save(self):
+        self.log.to_csv(self.path)
+
+
+def _refeid_query(eids, after=None):
+    query = ' OR '.join('REFEID(' + eid + ')' for eid in eids)
+    if after is None:
+        return query
+    return '(' + query + ') AND LOAD-DATE AFT ' + after.strftime('%Y%m%d')
+
+def _fetch(query, max_age):
+    '''
+    Records of query, or an error string. An empty result is no records.
+    '''
+
+    pages = list(search(None, query, max_age))
+    errors = [df for df, _ in pages if type(df) == str]
+    if errors:
+        return pd.DataFrame() if errors[0] == EMPTY else errors[0]
+    return pd.concat([df for df, _ in pages], ignore_index=True)
+
+def _delta(eids, after, max_age):
+    '''
+    Citing records of each EID loaded after the date after (all of them if
+    after is None), as {eid: records or error string}. A batch without
+    records settles all its EIDs in one query. A batch with records is
+    split in two, or asked EID by EID if it has about as many records as
+    EIDs.
+    '''
+
+    records = _fetch(_refeid_query(eids, after), max_age)
+    if len(eids) == 1:
+        return {eids[0]: records}
+    if type(records) != str and len(records) == 0:
+        return {eid: records for eid in eids}
+    if type(records) == str or len(records) >= len(eids):
+        return {eid: _fetch(_refeid_query([eid], after), max_age) for eid in eids}
+    half = len(eids) // 2
+    return dict(_delta(eids[:half], after, max_age), **_delta(eids[half:], after, max_age))
+
+def _pulled_eids(cited, cited_file):
+    '''
+    EIDs already pulled into cited_file, with the time their pull finished
+    if its pull journal recorded one (NaT otherwise): those with citing
+    records, and those finished without error in the journal.
+    '''
+
+    pulled = dict.fromkeys(cited['EID'].astype(str) if 'EID' in cited else [])
+    if os.path.exists(cited_file + '.journal'):
+        journal = ProgressJournal(cited_file + '.journal')
+        pulled.update({key: entry.get('time') for key, entry in journal.done.items() if entry['error'] is None})
+        journal.close()
+    return pd.to_datetime(pd.Series(pulled, dtype=object))
+
+def _write_pulled(records, file, eids):
+    '''
+    Write records to file. If file is the output of a pull_cited run, its
+    staging file is rewritten too and its pull journal rebuilt, with every
+    journaled EID and eids ending at the new end of file, so a later
+    pull_cited on file resumes after the merged records instead of cutting
+    them at an old offset.
+    '''
+
+    write_records(records, file)
+    if not os.path.exists(file + '.journal'):
+        return
+    stage = functions._staging(file)
+    if stage != file:
+        write_records(records, stage)
+    journal = ProgressJournal(file + '.journal')
+    journal.rewrite(os.path.getsize(stage), eids)
+    journal.close()
+
+@METRICS.staged('refresh_cited')
+def refresh_cited(data, cited_file, output_file=None, log_file='FetchLog.csv', since=None,
+                  overlap=1, max_age=MAX_AGE):
+    '''
+    Add citing records loaded since the last fetch to the cited-by records
+    of data's EIDs in cited_file, and write them to output_file (cited_file
+    by default). EIDs pulled before but not yet in the fetch log are taken
+    as fetched when their pull journal recorded them, or at since (by
+    default, the time cited_file was written) if it did not; EIDs never
+    pulled get all their records. The date restriction starts overlap days
+    early, and records are merged by eid, EID and unique_id, so records
+    seen twice are kept once, with their latest values. If the output is a
+    pull_cited output, its pull journal is rebuilt so a later pull_cited
+    resumes after the merged records. Returns the merged records.
+    '''
+
+    now = datetime.now()
+    cited = read_records(cited_file) if os.path.exists(cited_file) else pd.DataFrame()
+    if since is None and os.path.exists(cited_file):
+        since = datetime.fromtimestamp(os.path.getmtime(cited_file))
+    log = FetchLog(log_file)
+
+    eids = data['eid'].astype(str).to_list()
+    unique_ids = {}
+    for i, eid in enumerate(eids):
+        unique_ids.setdefault(eid, []).append(data['unique_id'].iloc[i] if 'unique_id' in data.columns else None)
+    pulled = _pulled_eids(cited, cited_file)
+    if since is not None:
+        pulled = pulled.fillna(pd.Timestamp(since))
+    last = log.last(list(unique_ids), 'cited_by')
+    last = last.fillna(pulled.reindex(last.index))
+
+    # One task per (date, batch of EIDs); EIDs never fetched are pulled whole
+    tasks = []
+    for day, group in last.groupby(last.dt.normalize(), dropna=False, sort=False):
+        if pd.isna(day):
+            tasks += [([eid], None) for eid in group.index]
+        else:
+            batches = _or_batches(list(group.index), lambda eid: 'REFEID(' + eid + ')')
+            tasks += [(batch, day - timedelta(days=overlap)) for batch, _ in batches]
+    print('Refreshing cited-by records of {} EIDs in {} batches.'.format(len(unique_ids), len(tasks)))
+
+    quota = METRICS.value('scopus_quota_used_total', stage='refresh_cited')
+    found, errors = {}, []
+    for i, result in enumerate(functions.CLIENT.map(lambda t: _delta(t[0], t[1], max_age), tasks)):
+        if i % 100 == 0: print('Batch {} of {}'.format(i, len(tasks)))
+        for eid, records in result.items():
+            if type(records) == str:
+                errors.append((eid, records))
+            else:
+                found[eid] = records
+
+    new = []
+    for eid, records in found.items():
+        if len(records) == 0:
+            continue
+        for unique_id in unique_ids[eid]:
+            rows = records
+            if unique_id is not None:
+                rows = rows.assign(award_id=re.search(r'(\d+)', unique_id).group(), unique_id=unique_id)
+            new.append(rows.assign(EID=eid))
+    keys = [col for col in ['eid', 'EID', 'unique_id'] if col in cited.columns or any(col in df for df in new)]
+    merged = pd.concat([cited] + new, ignore_index=True)
+    if len(merged):
+        merged = merged.drop_duplicates(subset=keys, keep='last').reset_index(drop=True)
+    _write_pulled(merged, output_file or cited_file, list(found))
+    log.mark(list(found), 'cited_by', now)
+    log.save()
+
+    print('Added {} new records for {} EIDs in {} queries, {} errors, written to {}.'.format(
+        len(merged) - len(cited), len(found),
+        METRICS.value('scopus_quota_used_total', stage='refresh_cited') - quota, len(errors), output_file or cited_file))
+    return merged
+
+@METRICS.staged('refresh_counts')
+def refresh_counts(records, log_file='FetchLog.csv', max_age=MAX_AGE):
+    '''
+    Update citation_count of records by eid, 25 EIDs per query. Returns a
+    copy of records; EIDs that could not be fetched keep their old count.
+    '''
+
+    now = datetime.now()
+    eids = records['eid'].dropna().astype(str).unique().tolist()
+    batches = list(_or_batches(eids, lambda eid: 'EID(' + eid + ')'))
+    print('Refreshing citation counts of {} EIDs in {} queries.'.format(len(eids), len(batches)))
+    counts, errors = {}, 0
+    for (batch, query), result in zip(batches, functions.CLIENT.map(lambda b: _fetch(b[1], max_age), batches)):
+        if type(result) == str:
+            errors += len(batch)
+        elif len(result):
+            counts.update(zip(result['eid'], result['citation_count']))
+    records = records.copy()
+    updated = records['eid'].astype(str).map(counts)
+    changed = (updated.notna() & (updated != pd.to_numeric(records['citation_count'], errors='coerce'))).sum()
+    records['citation_count'] = updated.where(updated.notna(), records['citation_count'])
+    log = FetchLog(log_file)
+    log.mark(list(counts), 'citation_count', now)
+    log.save()
+    print('Updated {} citation counts, {} EIDs not found or failed.'.format(changed, len(eids) - len(counts)))
+    return records
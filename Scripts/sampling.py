@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+'''
+Date: Sun Oct 18, 2026
+Purpose: This script draws the comparator sample stratified by Field and
+    Quartile (originally groupby(['Field', 'Quartile']).sample(frac=0.13)
+    without a seed) reproducibly and in one pass over chunks of the cleaned
+    comparator set. Each record gets a uniform value from a keyed hash of
+    its eid and the seed, and a stratum's sample is the records with the
+    smallest values: round(frac * stratum size) of them, or n. Only records
+    that can still make the sample are kept between chunks, so the same seed
+    gives the same sample whatever the chunk size or record order, and only
+    about the sample is held in memory.
+Execution: sample, check = sample_records('Comp_Final.csv', frac=0.13, seed=42)
+'''
+
+import numpy as np, pandas as pd
+from functions import iter_records
+
+
+STRATA = ['Field', 'Quartile']
+
+
+def hash_uniform(keys, seed=0):
+    '''
+    Uniform [0, 1) value for every key, fixed by key and seed.
+    '''
+
+    hash_key = '{:016x}'.format(seed % 2 ** 64)
+    h = pd.util.hash_array(np.asarray(keys, dtype=str).astype(object), hash_key=hash_key, categorize=False)
+    return (h >> np.uint64(11)).astype(float) * 2.0 ** -53
+
+
+class StratifiedSampler:
+    '''
+    Streaming stratified sample of frac of every stratum, or of n records
+    per stratum, drawn by hashed key. Records with a missing stratum are
+    left out.
+    '''
+
+    def __init__(self, frac=None, n=None, strata=STRATA, key='eid', seed=0):
+        if (frac is None) == (n is None):
+            raise ValueError('Give one of frac or n')
+        self.frac, self.n = frac, n
+        self.strata, self.key, self.seed = list(strata), key, seed
+        self.counts = None
+        self.candidates = None
+        self.rows = 0
+
+    def _index(self, df):
+        return pd.MultiIndex.from_frame(df[self.strata])
+
+    def _sizes(self, df):
+        return pd.Series(1, index=self._index(df)).groupby(level=self.strata).sum()
+
+    def _cutoffs(self, index):
+        '''
+        Hash value below which a record of each stratum can still be in the
+        sample: the sampled fraction plus 6 standard deviations of its
+        order statistic, all records for small strata.
+        '''
+
+        count = self.counts.reindex(index).to_numpy()
+        frac = self.frac
+        return np.minimum(1.0, frac + 6 * np.sqrt(frac * (1 - frac) / count) + 6 / count)
+
+    def _prune(self, df):
+        if self.n is not None:
+            df = df.sort_values('_u', kind='stable')
+            return df[df.groupby(self.strata).cumcount().to_numpy() < self.n]
+        return df[df['_u'].to_numpy() < self._cutoffs(self._index(df))]
+
+    def add(self, chunk):
+        '''
+        Add a chunk of records.
+        '''
+
+        chunk = chunk.dropna(subset=self.strata)
+        chunk = chunk.assign(_u=hash_uniform(chunk[self.key], self.seed),
+                             _row=np.arange(self.rows, self.rows + len(chunk)))
+        self.rows += len(chunk)
+        for col in self.strata:
+            chunk[col] = chunk[col].astype(str)
+        counts = self._sizes(chunk)
+        self.counts = counts if self.counts is None else self.counts.add(counts, fill_value=0)
+        frames = [chunk] if self.candidates is None else [self.candidates, chunk]
+        self.candidates = self._prune(pd.concat(frames, ignore_index=True))
+        return self
+
+    def sample(self):
+        '''
+        The sample, in input order.
+        '''
+
+        if self.candidates is None:
+            return pd.DataFrame()
+        df = self.candidates.sort_values('_u', kind='stable')
+        rank = df.groupby(self.strata).cumcount().to_numpy()
+        if self.n is not None:
+            size = self.n
+        else:
+            sizes = self.counts.map(lambda c: int(round(self.frac * c)))
+            size = sizes.reindex(self._index(df)).to_numpy()
+        return df[rank < size].sort_values('_row').drop(columns=['_u', '_row']).reset_index(drop=True)
+
+    def check(self, sample=None):
+        '''
+        Stratum-ratio check: records and share of records per stratum in the
+        population and in the sample, and the difference of the shares.
+        '''
+
+        if self.counts is None:
+            return pd.DataFrame(columns=['population', 'sample', 'population_share', 'sample_share', 'difference'])
+        sample = self.sample() if sample is None else sample
+        drawn = self._sizes(sample).reindex(self.counts.index, fill_value=0) if len(sample) else 0
+        check = pd.DataFrame({'population': self.counts.astype(int), 'sample': drawn})
+        check['population_share'] = check['population'] / check['population'].sum()
+        check['sample_share'] = check['sample'] / max(check['sample'].sum(), 1)
+        check['difference'] = check['sample_share'] - check['population_share']
+        return check
+
+
+def sample_records(source, frac=None, n=None, strata=STRATA, key='eid', seed=0, chunksize=100000):
+    '''
+    Stratified sample of a records file (csv or parquet, read in chunks) or
+    of an iterable of DataFrames. Returns the sample and its stratum-ratio
+    check.
+    '''
+
+    chunks = iter_records(source, chunksize) if isinstance(source, str) else source
+    sampler = StratifiedSampler(frac, n, strata, key, seed)
+    for chunk in chunks:
+        sampler.add(chunk)
+    sample = sampler.sample()
+    return sample, sampler.check(sample)
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+'''
+Date: Sun Oct 18, 2026
+Purpose: This script runs the significance tests of Data_Analysis_v1.ipynb
+    for every stratum in one batch: Welch t-tests (as R's t.test), permutation
+    tests and bootstrap confidence intervals of the difference in means.
+    dataset_tests() compares each dataset to the comparator set by metric,
+    field and quartile; rank_tests() compares the most and second most cited
+    article of every journal issue by field. t statistics are computed for all
+    strata at once from grouped moments. Resamples run per stratum over a
+    process pool, each stratum with its own RNG stream spawned from one seed,
+    so results do not depend on the number of processes.
+'''
+
+import numpy as np, pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from scipy import stats
+from zscore import issue_key
+
+
+FIELDS = ('EC', 'GI', 'NS', 'Other', 'All')
+BLOCK = 2 ** 24 # resampled values held in memory at once, per process
+
+
+def welch(n1, m1, v1, n2, m2, v2, alternative='greater', conf_level=0.95):
+    '''
+    Welch two sample t-tests from arrays of group sizes, means and sample
+    variances. Returns statistic, degrees of freedom, p-value and confidence
+    interval bounds of the difference in means, one value per stratum.
+    '''
+
+    n1, m1, v1, n2, m2, v2 = (np.asarray(a, dtype=float) for a in (n1, m1, v1, n2, m2, v2))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s1, s2 = v1 / n1, v2 / n2
+        se = np.sqrt(s1 + s2)
+        t = (m1 - m2) / se
+        df = (s1 + s2) ** 2 / (s1 ** 2 / (n1 - 1) + s2 ** 2 / (n2 - 1))
+    if alternative == 'greater':
+        p = stats.t.sf(t, df)
+        q = stats.t.ppf(conf_level, df)
+        low, high = m1 - m2 - q * se, np.full_like(t, np.inf)
+    elif alternative == 'less':
+        p = stats.t.cdf(t, df)
+        q = stats.t.ppf(conf_level, df)
+        low, high = np.full_like(t, -np.inf), m1 - m2 + q * se
+    else:
+        p = 2 * stats.t.sf(np.abs(t), df)
+        q = stats.t.ppf(1 - (1 - conf_level) / 2, df)
+        low, high = m1 - m2 - q * se, m1 - m2 + q * se
+    return t, df, p, low, high
+
+def _subsets(rng, n, k, b):
+    '''
+    b uniform random k-subsets of range(n) as a (b, k) array. Draws with
+    replacement, then redraws repeated values in the rows that have them
+    until every row is distinct. This costs O(b * k log k) rather than
+    permuting all n values for every subset.
+    '''
+
+    idx = np.sort(rng.integers(0, n, (b, k), dtype=np.int32), axis=1)
+    rows = np.arange(b)
+    while len(rows):
+        sub = idx[rows]
+        dup = np.zeros(sub.shape, dtype=bool)
+        dup[:, 1:] = sub[:, 1:] == sub[:, :-1]
+        has = dup.any(axis=1)
+        rows, sub, dup = rows[has], sub[has], dup[has]
+        sub[dup] = rng.integers(0, n, dup.sum(), dtype=np.int32)
+        sub.sort(axis=1)
+        idx[rows] = sub
+    return idx
+
+def _resample(x, y, n_perm, n_boot, alternative, conf_level, seed):
+    '''
+    Permutation p-value and bootstrap percentile interval of mean(x) - mean(y)
+    for one stratum.
+    '''
+
+    nx, ny = len(x), len(y)
+    if nx < 2 or ny < 2:
+        return np.nan, np.nan, np.nan
+    perm_rng, boot_rng = [np.random.default_rng(s) for s in seed.spawn(2)]
+    pooled = np.concatenate([x, y])
+    n, total = nx + ny, pooled.sum()
+    observed = x.mean() - y.mean()
+
+    # Only the sum of the values relabelled as x matters, so sample the
+    # smaller of the two groups
+    k = min(nx, ny)
+    diffs = [np.array([])]
+    for start in range(0, n_perm, max(1, BLOCK // k)):
+        sums = pooled[_subsets(perm_rng, n, k, min(max(1, BLOCK // k), n_perm - start))].sum(axis=1)
+        sx = sums if k == nx else total - sums
+        diffs.append(sx / nx - (total - sx) / ny)
+    diffs = np.concatenate(diffs)
+    tol = 1e-12 * max(1.0, abs(observed))
+    if alternative == 'greater':
+        hits = (diffs >= observed - tol).sum()
+    elif alternative == 'less':
+        hits = (diffs <= observed + tol).sum()
+    else:
+        hits = (np.abs(diffs - diffs.mean()) >= abs(observed - diffs.mean()) - tol).sum()
+    perm_p = (hits + 1) / (n_perm + 1) if n_perm else np.nan
+
+    boots = []
+    for start in range(0, n_boot, max(1, BLOCK // n)):
+        b = min(max(1, BLOCK // n), n_boot - start)
+        boots.append(x[boot_rng.integers(0, nx, (b, nx))].mean(axis=1) - y[boot_rng.integers(0, ny, (b, ny))].mean(axis=1))
+    if not boots:
+        return perm_p, np.nan, np.nan
+    low, high = np.quantile(np.concatenate(boots), [(1 - conf_level) / 2, 1 - (1 - conf_level) / 2])
+    return perm_p, low, high
+
+def _run(strata, n_perm, n_boot, alternative, conf_level, seed, processes):
+    '''
+    Test every (labels, x, y) stratum. Returns one row of results per stratum.
+    '''
+
+    labels = pd.DataFrame([s[0] for s in strata])
+    xs = [np.asarray(s[1], dtype=float) for s in strata]
+    ys = [np.asarray(s[2], dtype=float) for s in strata]
+    xs, ys = [x[~np.isnan(x)] for x in xs], [y[~np.isnan(y)] for y in ys]
+
+    n1, n2 = np.array([len(x) for x in xs]), np.array([len(y) for y in ys])
+    m1 = np.array([x.mean() if len(x) else np.nan for x in xs])
+    m2 = np.array([y.mean() if len(y) else np.nan for y in ys])
+    v1 = np.array([x.var(ddof=1) if len(x) > 1 else np.nan for x in xs])
+    v2 = np.array([y.var(ddof=1) if len(y) > 1 else np.nan for y in ys])
+    t, df, p, low, high = welch(n1, m1, v1, n2, m2, v2, alternative, conf_level)
+    result = labels.assign(n1=n1, n2=n2, estimate=m1 - m2, estimate1=m1, estimate2=m2, statistic=t,
+                           parameter=df, p_value=p, conf_low=low, conf_high=high)
+
+    if n_perm or n_boot:
+        seeds = np.random.SeedSequence(seed).spawn(len(strata))
+        args = [(x, y, n_perm, n_boot, alternative, conf_level, s) for x, y, s in zip(xs, ys, seeds)]
+        if processes == 1:
+            resampled = [_resample(*a) for a in args]
+        else:
+            with ProcessPoolExecutor(processes) as pool:
+                resampled = list(pool.map(_resample, *zip(*args)))
+        result['perm_p'], result['boot_low'], result['boot_high'] = np.array(resampled, dtype=float).T.tolist()
+    return result
+
+def dataset_tests(normed, datasets=('Interdisciplinary', 'WSC', 'NSF'), reference='Comparator',
+                  metrics=('citation_count', 'std'), fields=FIELDS, quartiles=(None, 'Quartile 1'),
+                  n_perm=10000, n_boot=2000, alternative='greater', conf_level=0.95, seed=42, processes=None):
+    '''
+    Test each dataset against the reference dataset for every metric, field
+    ('All' for every field) and quartile restriction (None for no
+    restriction) of a normalized table, as the t.test loops of the notebook.
+    '''
+
+    dataset, field, quartile = (normed[c].astype(str).to_numpy() for c in ['Dataset', 'Field', 'Quartile'])
+    values = {m: pd.to_numeric(normed[m]).to_numpy(dtype=float) for m in metrics}
+    strata = []
+    for q in quartiles:
+        in_q = np.ones(len(normed), dtype=bool) if q is None else quartile == q
+        for f in fields:
+            in_f = in_q if f == 'All' else in_q & (field == f)
+            ref = in_f & (dataset == reference)
+            for d in datasets:
+                mask = in_f & (dataset == d)
+                for metric in metrics:
+                    strata.append(({'metric': metric, 'Dataset': d, 'Field': f, 'Quartile': q or 'All'},
+                                   values[metric][mask], values[metric][ref]))
+    return _run(strata, n_perm, n_boot, alternative, conf_level, seed, processes)
+
+def top_two(normed, key='query', value='citation_count', seed=42):
+    '''
+    Most and second most cited article (rank 1 and 2) of every journal issue
+    with more than one article, ties broken at random.
+    '''
+
+    rng = np.random.default_rng(seed)
+    df = normed.assign(_key=issue_key(normed, key).to_numpy(), _tie=rng.random(len(normed)),
+                       _value=pd.to_numeric(normed[value]).to_numpy())
+    df = df[df.groupby('_key')['_key'].transform('size').to_numpy() > 1]
+    df = df.sort_values(['_key', '_value', '_tie'], ascending=[True, False, True])
+    df['rank'] = df.groupby('_key').cumcount().to_numpy() + 1
+    return df[df['rank'] <= 2].drop(columns=['_key', '_tie', '_value'])
+
+def rank_tests(normed, key='query', value='citation_count', fields=FIELDS, n_perm=10000, n_boot=2000,
+               alternative='greater', conf_level=0.95, seed=42, processes=None):
+    '''
+    Test rank 1 against rank 2 citation counts of journal issues by field.
+    Adds sd, the mean issue standard deviation of the field.
+    '''
+
+    top = top_two(normed, key, value, seed)
+    field = top['Field'].astype(str).to_numpy()
+    values = pd.to_numeric(top[value]).to_numpy(dtype=float)
+    first, second = top['rank'].to_numpy() == 1, top['rank'].to_numpy() == 2
+    strata, sd = [], []
+    for f in fields:
+        in_f = np.ones(len(top), dtype=bool) if f == 'All' else field == f
+        strata.append(({'metric': value, 'Field': f}, values[in_f & first], values[in_f & second]))
+        if 'z_sd' in top.columns:
+            sd.append(top.loc[in_f & first, 'z_sd'].mean())
+    result = _run(strata, n_perm, n_boot, alternative, conf_level, seed, processes)
+    if sd:
+        result['sd'] = sd
+    return result
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+'''
+Date: Sun Oct 18, 2026
+Purpose: This script computes the journal issue citation normalization used in
+    the analysis (group_by(tolower(query)) then scale(citation_count) in
+    Data_Analysis_v1.ipynb): each article's citation count as a z-score
+    against the mean and sample standard deviation of its journal issue
+    query. normalize() does this in one vectorized pass over the datasets from
+    clean_data. IssueStats keeps running per-issue count, mean and sum of
+    squares (Welford/Chan updates) so newly pulled articles and refreshed
+    citation counts update the z-scores without re-scanning the corpus.
+'''
+
+import numpy as np, pandas as pd
+
+
+def issue_key(df, key='query'):
+    '''
+    Lower-cased grouping key, as tolower(query) in the notebook.
+    '''
+
+    return df[key].astype(str).str.lower()
+
+def normalize(df, key='query', value='citation_count', pool=None, dropna=True):
+    '''
+    Add z_mean, z_sd and std (z-score) columns grouped by issue key, and by
+    pool if given (e.g. a column separating datasets normalized apart).
+    With dropna, rows of issues with one article (undefined sd) are dropped,
+    as drop_na(z.sd) in the notebook.
+    '''
+
+    keys = [issue_key(df, key)] + ([df[pool]] if pool is not None else [])
+    grouped = pd.to_numeric(df[value]).groupby(keys, observed=True, sort=False)
+    df = df.assign(z_mean=grouped.transform('mean'), z_sd=grouped.transform('std'))
+    df['std'] = (pd.to_numeric(df[value]) - df['z_mean']) / df['z_sd']
+    return df.dropna(subset=['z_sd']) if dropna else df
+
+
+class IssueStats:
+    '''
+    Running per-issue n, mean and M2 (sum of squared deviations), plus the
+    last value seen for each record so refreshed counts replace old ones.
+    '''
+
+    def __init__(self, key='query', value='citation_count', id_col='eid'):
+        self.key, self.value, self.id_col = key, value, id_col
+        self.stats = pd.DataFrame({'n': [], 'mean': [], 'M2': []}, index=pd.Index([], dtype=object))
+        self.records = pd.DataFrame({'key': [], 'value': []}, index=pd.Index([], dtype=object))
+
+    def _combine(self, keys, values, sign):
+        '''
+        Merge (sign=1) or remove (sign=-1) a batch of values with Chan's
+        parallel form of Welford's update.
+        '''
+
+        if len(values) == 0:
+            return
+        batch = pd.Series(np.asarray(values, dtype=float)).groupby(np.asarray(keys), sort=False)
+        b = pd.DataFrame({'n': batch.count(), 'mean': batch.mean()})
+        b['M2'] = batch.var(ddof=0) * b['n']
+        new_keys = b.index.difference(self.stats.index)
+        if len(new_keys):
+            self.stats = pd.concat([self.stats, pd.DataFrame(0.0, index=new_keys, columns=self.stats.columns)])
+        a = self.stats.loc[b.index]
+        if sign > 0:
+            n = a['n'] + b['n']
+            delta = b['mean'] - a['mean']
+            mean = a['mean'] + delta * b['n'] / n
+            M2 = a['M2'] + b['M2'] + delta ** 2 * a['n'] * b['n'] / n
+        else:
+            n = a['n'] - b['n']
+            rest = n.where(n > 0, 1)
+            mean = (a['n'] * a['mean'] - b['n'] * b['mean']) / rest
+            delta = b['mean'] - mean
+            M2 = a['M2'] - b['M2'] - delta ** 2 * n * b['n'] / a['n']
+            mean, M2 = mean.where(n > 0, 0.0), M2.where(n > 0, 0.0).clip(lower=0)
+        self.stats.loc[b.index, 'n'] = n
+        self.stats.loc[b.index, 'mean'] = mean
+        self.stats.loc[b.index, 'M2'] = M2
+
+    def upsert(self, df):
+        '''
+        Add new records and replace the values of records seen before.
+        '''
+
+        df = df.drop_duplicates(self.id_col, keep='last')
+        ids = df[self.id_col].to_numpy(dtype=object)
+        keys = issue_key(df, self.key).to_numpy(dtype=object)
+        values = pd.to_numeric(df[self.value]).to_numpy(dtype=float)
+        ok = ~np.isnan(values)
+        ids, keys, values = ids[ok], keys[ok], values[ok]
+
+        seen = self.records.index.isin(ids)
+        old = self.records[seen]
+        self._combine(old['key'].to_numpy(), old['value'].to_numpy(), -1)
+        self._combine(keys, values, 1)
+        self.records = pd.concat([self.records[~seen],
+                                  pd.DataFrame({'key': keys, 'value': values}, index=pd.Index(ids, dtype=object))])
+        return self
+
+    def summary(self):
+        '''
+        Per-issue n, z_mean and z_sd (sample standard deviation).
+        '''
+
+        return pd.DataFrame({'n': self.stats['n'], 'z_mean': self.stats['mean'],
+                             'z_sd': np.sqrt(self.stats['M2'] / (self.stats['n'] - 1).where(self.stats['n'] > 1))})
+
+    def transform(self, df, dropna=True):
+        '''
+        Add z_mean, z_sd and std columns to df from the running statistics.
+        '''
+
+        s = self.summary()
+        pos = s.index.get_indexer(issue_key(df, self.key))
+        df = df.assign(z_mean=s['z_mean'].to_numpy().take(pos, mode='clip'),
+                       z_sd=s['z_sd'].to_numpy().take(pos, mode='clip'))
+        df.loc[pos < 0, ['z_mean', 'z_sd']] = np.nan
+        df['std'] = (pd.to_numeric(df[self.value]) - df['z_mean']) / df['z_sd']
+        return df.dropna(subset=['z_sd']) if dropna else df
+
+    def save(self, file):
+        self.records.rename_axis(self.id_col).to_csv(file)
+
+    @classmethod
+    def load(cls, file, **kwargs):
+        '''
+        Rebuild statistics from records saved with save().
+        '''
+
+        stats = cls(**kwargs)
+        records = pd.read_csv(file, dtype={'key': str})
+        stats._combine(records['key'].to_numpy(), records['value'].to_numpy(), 1)
+        stats.records = records.set_index(stats.id_col)[['key', 'value']]
+        stats.records.index = stats.records.index.astype(object)
+        return stats